@@ -1,9 +1,12 @@
 #!/bin/bash
 SCRIPTPATH="$( cd "$(dirname "$0")" ; pwd -P )"
-USAGE_MSG="Usage:\n--srcpath path \t Path to the source file\n --syspath path \t Path to the MT output file"
+USAGE_MSG="Usage:\n--srcpath path \t Path to the source file\n --syspath path \t Path to the MT output file\n --savemodel dir \t Directory to save the trained aligner model\n --model dir \t Directory of a saved model, used to align without training\n --workdir dir \t Directory for the intermediate and output files (default: /tmp)"
 
 SRCPATH=""
 SYSPATH=""
+SAVEMODEL=""
+MODEL=""
+WORKDIR=""
 
 ##################
 # Argument parsing
@@ -32,6 +35,36 @@ do
                 (>&2 echo -e $USAGE_MSG)
                 exit 0
             fi
+        ;;
+        --savemodel)
+            if [ -z $SAVEMODEL ]; then
+                SAVEMODEL="$2"
+                shift # past argument
+                shift # past value
+            else
+                (>&2 echo -e $USAGE_MSG)
+                exit 0
+            fi
+        ;;
+        --model)
+            if [ -z $MODEL ]; then
+                MODEL="$2"
+                shift # past argument
+                shift # past value
+            else
+                (>&2 echo -e $USAGE_MSG)
+                exit 0
+            fi
+        ;;
+        --workdir)
+            if [ -z $WORKDIR ]; then
+                WORKDIR="$2"
+                shift # past argument
+                shift # past value
+            else
+                (>&2 echo -e $USAGE_MSG)
+                exit 0
+            fi
         ;;
             *)    # unknown option
             (>&2 echo -e $USAGE_MSG)
@@ -49,6 +82,9 @@ if [ -z $SYSPATH ]; then
     (>&2 echo -e $USAGE_MSG)
     exit 0
 fi
+if [ -z $WORKDIR ]; then
+    WORKDIR="/tmp"
+fi
 
 #############
 # Align words
@@ -57,19 +93,57 @@ align_words() {
     SRC_FILENAME=$(basename $1)
     SYS_FILENAME=$(basename $2)
 
-    perl $SCRIPTPATH/Alinhador_de_Palavras/concatena_dicionario.pl $1 $2 $SCRIPTPATH/Alinhador_de_Palavras/Dicionarios/dicionario_en-pt_v2_158037_freqmin_1.txt "/tmp/$SRC_FILENAME.concat" "/tmp/$SYS_FILENAME.concat"
+    perl $SCRIPTPATH/Alinhador_de_Palavras/concatena_dicionario.pl $1 $2 $SCRIPTPATH/Alinhador_de_Palavras/Dicionarios/dicionario_en-pt_v2_158037_freqmin_1.txt "$WORKDIR/$SRC_FILENAME.concat" "$WORKDIR/$SYS_FILENAME.concat"
 
     # Generate MGIZA input
-    $SCRIPTPATH/mgiza/mgizapp/bin/plain2snt "/tmp/$SRC_FILENAME.concat" "/tmp/$SYS_FILENAME.concat" -vcb1 "/tmp/$SRC_FILENAME.vcb" -vcb2 "/tmp/$SYS_FILENAME.vcb" -snt1 "/tmp/$SRC_FILENAME-$SYS_FILENAME.snt" -snt2 "/tmp/$SYS_FILENAME-$SRC_FILENAME.snt" > /dev/null 2>&1
-    $SCRIPTPATH/mgiza/mgizapp/bin/mkcls -p"/tmp/$SRC_FILENAME.concat" -V"/tmp/$SRC_FILENAME.classes" > /dev/null 2>&1
-    $SCRIPTPATH/mgiza/mgizapp/bin/mkcls -p"/tmp/$SYS_FILENAME.concat" -V"/tmp/$SYS_FILENAME.classes" > /dev/null 2>&1
+    $SCRIPTPATH/mgiza/mgizapp/bin/plain2snt "$WORKDIR/$SRC_FILENAME.concat" "$WORKDIR/$SYS_FILENAME.concat" -vcb1 "$WORKDIR/$SRC_FILENAME.vcb" -vcb2 "$WORKDIR/$SYS_FILENAME.vcb" -snt1 "$WORKDIR/$SRC_FILENAME-$SYS_FILENAME.snt" -snt2 "$WORKDIR/$SYS_FILENAME-$SRC_FILENAME.snt" > /dev/null 2>&1
+    $SCRIPTPATH/mgiza/mgizapp/bin/mkcls -p"$WORKDIR/$SRC_FILENAME.concat" -V"$WORKDIR/$SRC_FILENAME.classes" > /dev/null 2>&1
+    $SCRIPTPATH/mgiza/mgizapp/bin/mkcls -p"$WORKDIR/$SYS_FILENAME.concat" -V"$WORKDIR/$SYS_FILENAME.classes" > /dev/null 2>&1
 
     # Generate CoocurrenceFile
-    $SCRIPTPATH/mgiza/mgizapp/bin/snt2cooc "/tmp/giza-cooc" "/tmp/$SRC_FILENAME.vcb" "/tmp/$SYS_FILENAME.vcb" "/tmp/$SYS_FILENAME-$SRC_FILENAME.snt" > /dev/null 2>&1
+    $SCRIPTPATH/mgiza/mgizapp/bin/snt2cooc "$WORKDIR/giza-cooc" "$WORKDIR/$SRC_FILENAME.vcb" "$WORKDIR/$SYS_FILENAME.vcb" "$WORKDIR/$SYS_FILENAME-$SRC_FILENAME.snt" > /dev/null 2>&1
 
-    cd /tmp/
+    cd "$WORKDIR"
     # Run MGIZA
-    $SCRIPTPATH/mgiza/mgizapp/bin/mgiza -S "/tmp/$SRC_FILENAME.vcb" -T "/tmp/$SYS_FILENAME.vcb" -C "/tmp/$SRC_FILENAME-$SYS_FILENAME.snt" -CoocurrenceFile "/tmp/giza-cooc" -sourcevocabularyclasses "/tmp/$SRC_FILENAME.classes" -targetvocabularyclasses "/tmp/$SYS_FILENAME.classes" -o "src-sys" > /dev/null 2>&1
+    $SCRIPTPATH/mgiza/mgizapp/bin/mgiza -S "$WORKDIR/$SRC_FILENAME.vcb" -T "$WORKDIR/$SYS_FILENAME.vcb" -C "$WORKDIR/$SRC_FILENAME-$SYS_FILENAME.snt" -CoocurrenceFile "$WORKDIR/giza-cooc" -sourcevocabularyclasses "$WORKDIR/$SRC_FILENAME.classes" -targetvocabularyclasses "$WORKDIR/$SYS_FILENAME.classes" -o "src-sys" > /dev/null 2>&1
+
+    # Concatenate all files produced by MGIZA
+    cat src-sys.A3.final.part* > giza.output
+    rm src-sys.*.final.*
+
+    # Keep vocabularies, word classes and final model parameters
+    if [ -n "$SAVEMODEL" ]; then
+        cp "$WORKDIR/$SRC_FILENAME.vcb" "$SAVEMODEL/src.vcb"
+        cp "$WORKDIR/$SYS_FILENAME.vcb" "$SAVEMODEL/sys.vcb"
+        cp "$WORKDIR/$SRC_FILENAME.classes" "$SAVEMODEL/src.classes"
+        cp "$WORKDIR/$SRC_FILENAME.classes.cats" "$SAVEMODEL/src.classes.cats"
+        cp "$WORKDIR/$SYS_FILENAME.classes" "$SAVEMODEL/sys.classes"
+        cp "$WORKDIR/$SYS_FILENAME.classes.cats" "$SAVEMODEL/sys.classes.cats"
+        for PARAMS in t3 a3 d3 n3 d4 D4; do
+            cp "src-sys.$PARAMS.final" "$SAVEMODEL/src-sys.$PARAMS.final"
+        done
+    fi
+
+    cd $SCRIPTPATH
+    echo $(wc -l < $1)
+}
+
+##############################################
+# Align words with a previously trained model
+##############################################
+force_align_words() {
+    SRC_FILENAME=$(basename $1)
+    SYS_FILENAME=$(basename $2)
+
+    # Map words to the ids of the model vocabularies, adding the unknown ones
+    python3 $SCRIPTPATH/plain2snt_hasvcb.py "$MODEL/src.vcb" "$MODEL/sys.vcb" $1 $2 "$WORKDIR/$SRC_FILENAME.vcb" "$WORKDIR/$SYS_FILENAME.vcb" "$WORKDIR/$SRC_FILENAME-$SYS_FILENAME.snt"
+    $SCRIPTPATH/mgiza/mgizapp/bin/snt2cooc "$WORKDIR/giza-cooc" "$WORKDIR/$SRC_FILENAME.vcb" "$WORKDIR/$SYS_FILENAME.vcb" "$WORKDIR/$SRC_FILENAME-$SYS_FILENAME.snt" > /dev/null 2>&1
+
+    cd "$WORKDIR"
+    # Run MGIZA restarting from the final model, with a single Model 4 iteration
+    $SCRIPTPATH/mgiza/mgizapp/bin/mgiza -S "$WORKDIR/$SRC_FILENAME.vcb" -T "$WORKDIR/$SYS_FILENAME.vcb" -C "$WORKDIR/$SRC_FILENAME-$SYS_FILENAME.snt" -CoocurrenceFile "$WORKDIR/giza-cooc" -sourcevocabularyclasses "$MODEL/src.classes" -targetvocabularyclasses "$MODEL/sys.classes" -o "src-sys" \
+        -restart 11 -previoust "$MODEL/src-sys.t3.final" -previousa "$MODEL/src-sys.a3.final" -previousd "$MODEL/src-sys.d3.final" -previousn "$MODEL/src-sys.n3.final" -previousd4 "$MODEL/src-sys.d4.final" -previousd42 "$MODEL/src-sys.D4.final" \
+        -m1 0 -m2 0 -mh 0 -m3 0 -m4 1 > /dev/null 2>&1
 
     # Concatenate all files produced by MGIZA
     cat src-sys.A3.final.part* > giza.output
@@ -79,4 +153,8 @@ align_words() {
     echo $(wc -l < $1)
 }
 
-align_words $SRCPATH $SYSPATH
+if [ -n "$MODEL" ]; then
+    force_align_words $SRCPATH $SYSPATH
+else
+    align_words $SRCPATH $SYSPATH
+fi
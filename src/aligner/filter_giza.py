@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 import argparse
-import re
-from itertools import islice
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from readers.read_giza import GIZAReader  # noqa: E402
 
 parser = argparse.ArgumentParser()
 parser.add_argument('--filepath', '-f', required=True,
@@ -14,28 +17,17 @@ parser.add_argument('--numlines', '-n', required=True,
 FLAGS = parser.parse_args()
 
 aligned_lines = list()
-with open(FLAGS.filepath, 'r') as giza_file:
-    while True:
-        line_info = giza_file.readline()
-        if not line_info:
-            break
-        line_plain = giza_file.readline()
-        line_aligned = giza_file.readline()
-
-        line_num = int(re.findall(r'\(([^\)]*)\)', line_info)[0])
-        if line_num <= FLAGS.numlines:
-            line_aligned = re.findall(r'(\w+) \(\{([^\}]*)\}\)', line_aligned)
-            alignment = list()
-
-            for (i, w) in enumerate(line_aligned):
-                indices = map(int, w[1].split())
-                alignment.extend(
-                    [(j - 1, None) if w[0] == 'NULL' else (j - 1, i - 1) for j in indices])
+for line in GIZAReader(FLAGS.filepath).aligned_lines:
+    # Line numbers in the file start at 1
+    line_num = line['num'] + 1
+    if line_num <= FLAGS.numlines:
+        # Alignment as (lang1, lang2) tuples, without the unaligned lang2 words
+        alignment = [(j, i) for (i, j) in line['alignment'] if j is not None]
 
-            aligned_lines.append({'num': line_num,
-                                  'lang1': line_plain.split(),
-                                  'lang2': [w[0] for w in line_aligned if w[0] != 'NULL'],
-                                  'alignment': alignment})
+        aligned_lines.append({'num': line_num,
+                              'lang1': line['sys'],
+                              'lang2': line['src'],
+                              'alignment': alignment})
 
 print(aligned_lines[0]['lang1'])
 print(aligned_lines[0]['lang2'])
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""Converts a parallel corpus to the MGIZA format using the vocabularies of a
+trained model, so that its parameters can be reused to align the corpus.
+Words not in the vocabularies are appended to them with new ids.
+"""
+import argparse
+
+
+def read_vcb(path):
+    """Reads a MGIZA vocabulary file
+
+    Arguments:
+        path {str} -- Path to the vocabulary file
+
+    Returns:
+        dict -- Word to a list [id, count]
+    """
+    vcb = dict()
+    with open(path, 'r') as vcb_file:
+        for line in vcb_file:
+            fields = line.split()
+            if len(fields) == 3:
+                vcb[fields[1]] = [int(fields[0]), int(fields[2])]
+    return vcb
+
+
+def write_vcb(vcb, path):
+    with open(path, 'w') as vcb_file:
+        for (word, (word_id, count)) in sorted(vcb.items(), key=lambda w: w[1][0]):
+            vcb_file.write('{} {} {}\n'.format(word_id, word, count))
+
+
+def sentence_ids(line, vcb):
+    """Ids of the words in `line`, adding the unknown ones to `vcb`"""
+    ids = list()
+    for word in line.split():
+        if word not in vcb:
+            # Ids 0 and 1 are reserved by GIZA, words are numbered from 2
+            vcb[word] = [len(vcb) + 2, 0]
+        vcb[word][1] += 1
+        ids.append(str(vcb[word][0]))
+    return ids
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('src_vcb', help='Source vocabulary of the trained model')
+    parser.add_argument('sys_vcb', help='Target vocabulary of the trained model')
+    parser.add_argument('src', help='Source side of the corpus')
+    parser.add_argument('sys', help='Target side of the corpus')
+    parser.add_argument('src_vcb_out', help='Path to the new source vocabulary')
+    parser.add_argument('sys_vcb_out', help='Path to the new target vocabulary')
+    parser.add_argument('snt_out', help='Path to the corpus in the MGIZA format')
+    FLAGS = parser.parse_args()
+
+    src_vcb = read_vcb(FLAGS.src_vcb)
+    sys_vcb = read_vcb(FLAGS.sys_vcb)
+
+    with open(FLAGS.src, 'r') as src_file, open(FLAGS.sys, 'r') as sys_file, \
+            open(FLAGS.snt_out, 'w') as snt_file:
+        for (src_line, sys_line) in zip(src_file, sys_file):
+            snt_file.write('1\n')
+            snt_file.write(' '.join(sentence_ids(src_line, src_vcb)) + '\n')
+            snt_file.write(' '.join(sentence_ids(sys_line, sys_vcb)) + '\n')
+
+    write_vcb(src_vcb, FLAGS.src_vcb_out)
+    write_vcb(sys_vcb, FLAGS.sys_vcb_out)
@@ -0,0 +1,266 @@
+"""Long-lived Apertium taggers.
+
+Implements the same pipeline as `parse_file.sh`, but `lt-proc` and `apertium-tagger`
+are started only once per language and run in null-flush mode: each sentence is
+terminated by a null character and the tools flush their output when they read it.
+The text preprocessing and postprocessing done with `sed` by the script are
+reproduced with the regular expressions below.
+"""
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+from functools import lru_cache
+from multiprocessing import Pool, cpu_count
+
+APERTIUM_PATH = os.path.dirname(os.path.abspath(__file__))
+
+# Must be increased whenever a change in this module changes the tagger output
+PIPELINE_VERSION = 2
+
+# Same substitutions as the preprocessing in `parse_file.sh`
+PREPROCESSING = [(re.compile(r'@-@'), '-'),  # Moses format @-@ to -
+                 (re.compile(r'(\w)\s\$\s(\d)'), r'\1 &crf; \2'),  # US $ 1 to US &crf; 1
+                 (re.compile(r'/'), '&frasl;'),
+                 (re.compile(r'--'), '-'),
+                 (re.compile(r'–'), '-'),
+                 (re.compile(r'“'), '"'),
+                 (re.compile(r'´'), "'"),
+                 (re.compile(r'``'), '"')]
+
+# Same substitutions as the postprocessing in `parse_file.sh`
+POSTPROCESSING = [(re.compile(r'\s>'), ' ^>$'),
+                  (re.compile(r'"'), '^"$'),
+                  (re.compile(r'#\s'), '$ ^ '),
+                  (re.compile(r'-\s'), ' ^-$ '),
+                  (re.compile(r'%\s'), ' ^%$ '),
+                  (re.compile(r'\+\s'), ' ^+$ '),
+                  (re.compile(r'¬\s'), ' ^¬$ '),
+                  (re.compile(r'°\s'), ' ^°$ '),
+                  (re.compile(r'<\^([^$]*)\$>'), r'^\1$'),  # <token> to token
+                  (re.compile(r'&\^\*frasl\$\^;<sent>\$'), '^/$'),
+                  (re.compile(r'&\^\*?crf(<sig>)?\$\^;<sent>\$'), '^cfr$'),
+                  (re.compile(r'\s&\s'), ' ^&$ '),
+                  (re.compile(r'\+o seu([^$]*\$)'), r'+o\1 ^seu\1'),
+                  (re.compile(r'\+o qual([^$]*\$)'), r'+o\1 ^qual\1'),
+                  (re.compile(r'\+o nosso([^$]*\$)'), r'+o\1 ^nosso\1'),
+                  (re.compile(r'(\^[Tt]he[^$]*)\+(most[^$]*\$)'), r'\1$ ^\2'),
+                  (re.compile(r'(\^go[^$]*)\+(on[^$]*\$)'), r'\1$ ^\2')]
+
+# Characters escaped by the Apertium plain text deformatter
+ESCAPED_CHARS = re.compile(r'([\[\]\\^$@/<>{}])')
+
+# Lexical units in the Apertium stream format and the separator of their analyses
+UNIT = re.compile(r'\^((?:\\.|[^$\\])*)\$')
+UNESCAPED_SLASH = re.compile(r'(?<!\\)/')
+
+
+def data_files(lang):
+    """Paths of the morphological dictionary and of the tagger model of a language"""
+    data_path = os.path.join(APERTIUM_PATH, 'apertium-' + lang)
+    return (os.path.join(data_path, lang + '.automorf_retratos.bin'),
+            os.path.join(data_path, lang + '.prob'))
+
+
+@lru_cache()
+def tagger_version(lang):
+    """Identifies the tagger of a language by the contents of its data files
+    and the version of this pipeline, so cached results of older taggers are not reused
+
+    Arguments:
+        lang {str} -- Language of the tagger
+
+    Returns:
+        str -- Hexadecimal digest
+    """
+    digest = hashlib.sha1(str(PIPELINE_VERSION).encode('utf-8'))
+    for path in data_files(lang):
+        with open(path, 'rb') as _file:
+            digest.update(_file.read())
+    return digest.hexdigest()
+
+
+def preprocess(line):
+    """Prepares a tokenized sentence to be analysed, as `parse_file.sh` does
+
+    Arguments:
+        line {list} -- Tokens of the sentence
+
+    Returns:
+        str -- Deformatted sentence, ready for `lt-proc`
+    """
+    data = ' '.join(' '.join(line).split())
+    for (pattern, replacement) in PREPROCESSING:
+        data = pattern.sub(replacement, data)
+    return ESCAPED_CHARS.sub(r'\\\1', data)
+
+
+def postprocess(tagger_output):
+    """Reformats the output of `apertium-tagger` as `parse_file.sh` does
+
+    Arguments:
+        tagger_output {str} -- Output of the tagger for one sentence
+
+    Returns:
+        str -- Tagged sentence in the Apertium stream format
+    """
+    data = ' '.join(re.sub(r'\\(.)', r'\1', tagger_output).split())
+    for (pattern, replacement) in POSTPROCESSING:
+        data = pattern.sub(replacement, data)
+    return ' '.join(data.split())
+
+
+def analysis_units(analysis):
+    """Splits the output of `lt-proc -a` into its lexical units
+
+    Arguments:
+        analysis {str} -- Output of the analyser, as `^surface/analysis1/analysis2$ ...`
+
+    Returns:
+        list -- Pairs (surface form, list of analyses), still escaped
+    """
+    units = list()
+    for unit in UNIT.findall(analysis):
+        parts = UNESCAPED_SLASH.split(unit)
+        units.append((parts[0], parts[1:]))
+    return units
+
+
+def has_multiword(analysis):
+    """Checks whether the output of `lt-proc -a` has a multiword unit,
+    whose surface form spans several tokens
+    """
+    return any(' ' in surface for (surface, _) in analysis_units(analysis))
+
+
+class ApertiumTagger(object):
+    """Morphological analyser and tagger processes for a single language,
+    kept alive to tag any number of sentences.
+    """
+
+    def __init__(self, lang):
+        for tool in ['lt-proc', 'apertium-tagger']:
+            if not shutil.which(tool):
+                raise RuntimeError('Please install {} by running '
+                                   '"sudo apt install apertium lttoolbox"'.format(tool))
+
+        automorf_path, prob_path = data_files(lang)
+        env = dict(os.environ, LC_ALL='en_US.UTF-8')
+        self.analyser = subprocess.Popen(['lt-proc', '-z', '-a', automorf_path],
+                                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env)
+        self.tagger = subprocess.Popen(['apertium-tagger', '-z', '-g', prob_path],
+                                       stdin=subprocess.PIPE, stdout=subprocess.PIPE, env=env)
+
+    @staticmethod
+    def _flush(proc, data):
+        """Sends `data` followed by a null character to `proc`,
+        then reads its output up to the null character it writes back
+        """
+        proc.stdin.write(data.encode('utf-8') + b'\0')
+        proc.stdin.flush()
+
+        # Nothing else is written after the null character until the next input
+        out = b''
+        while not out.endswith(b'\0'):
+            chunk = proc.stdout.read1(65536)
+            if not chunk:
+                raise RuntimeError('Apertium process finished unexpectedly')
+            out += chunk
+        return out[:-1].decode('utf-8')
+
+    def analyse(self, line):
+        """Runs the morphological analyser over a sentence
+
+        Arguments:
+            line {list} -- Tokens of the sentence
+
+        Returns:
+            str -- Output of `lt-proc`, with every analysis of each token
+        """
+        return self._flush(self.analyser, preprocess(line))
+
+    def tag(self, line):
+        """Tags a sentence, with the same output as `parse_file.sh`
+
+        Arguments:
+            line {list} -- Tokens of the sentence
+
+        Returns:
+            str -- Tagged sentence in the Apertium format
+        """
+        return postprocess(self.tag_raw(line)[1])
+
+    def tag_raw(self, line):
+        """Analyses and tags a sentence, without postprocessing
+
+        Arguments:
+            line {list} -- Tokens of the sentence
+
+        Returns:
+            tuple -- Outputs of `lt-proc` and of `apertium-tagger`
+        """
+        analysis = self.analyse(line)
+        return analysis, self._flush(self.tagger, analysis)
+
+    def close(self):
+        for proc in [self.analyser, self.tagger]:
+            proc.stdin.close()
+            proc.wait()
+
+
+# Taggers of the current worker process, by language
+_WORKER_TAGGERS = dict()
+
+
+def _tag_batch(args):
+    lang, lines, raw, analyse = args
+    if lang not in _WORKER_TAGGERS:
+        _WORKER_TAGGERS[lang] = ApertiumTagger(lang)
+    if analyse:
+        return [_WORKER_TAGGERS[lang].analyse(line) for line in lines]
+    if raw:
+        return [_WORKER_TAGGERS[lang].tag_raw(line) for line in lines]
+    return [_WORKER_TAGGERS[lang].tag(line) for line in lines]
+
+
+class TaggerPool(object):
+    """Worker processes, each one with its own long-lived `ApertiumTagger` per language.
+    Sentences are sent to the workers in batches and tagged in parallel.
+    """
+
+    def __init__(self, processes=None, batch_size=50):
+        self.batch_size = batch_size
+        self.pool = Pool(processes or cpu_count())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def imap(self, lines, lang, raw=False, analyse=False):
+        """Tags sentences in parallel
+
+        Arguments:
+            lines {list} -- Tokenized sentences
+            lang {str} -- Language of the sentences
+
+        Keyword Arguments:
+            raw {bool} -- Whether to yield the outputs of `ApertiumTagger.tag_raw` (default: {False})
+            analyse {bool} -- Whether to yield the outputs of `ApertiumTagger.analyse`,
+                              without tagging (default: {False})
+
+        Yields:
+            str -- Each tagged sentence, in the same order as `lines`
+        """
+        batches = [(lang, lines[i:i + self.batch_size], raw, analyse)
+                   for i in range(0, len(lines), self.batch_size)]
+        for tagged_batch in self.pool.imap(_tag_batch, batches):
+            for tagged_line in tagged_batch:
+                yield tagged_line
+
+    def close(self):
+        # Terminating the workers closes the pipes of their taggers, which then exit
+        self.pool.terminate()
+        self.pool.join()
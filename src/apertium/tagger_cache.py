@@ -0,0 +1,178 @@
+"""On-disk cache of Apertium tagging results.
+
+Each tagged sentence is stored in a sqlite database under a key computed from
+the language, the version of the tagger and the sentence text, so the same
+sentence is sent to Apertium only once across trainings and classifications.
+
+The tagger output of each word form analysed alone is also stored, when it does
+not depend on the context: the form has a single analysis. A sentence made only
+of such forms is only analysed with `lt-proc`, which finds the multiword units of
+the dictionary. If it has none, it is tagged by joining the outputs of its forms,
+without `apertium-tagger`.
+"""
+import hashlib
+import os
+import sqlite3
+from apertium.apertium_tagger import APERTIUM_PATH, tagger_version, analysis_units, \
+    has_multiword, postprocess
+
+CACHE_PATH = os.path.join(APERTIUM_PATH, 'tagger_cache.sqlite')
+
+# Maximum number of keys in a single query, below the sqlite variable limit
+QUERY_SIZE = 500
+
+# Forms whose preprocessing depends on the neighbouring tokens (US $ 1 to US &crf; 1)
+CONTEXT_FORMS = {'$'}
+
+
+class TaggerCache(object):
+
+    def __init__(self, path=CACHE_PATH):
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS tagged '
+                                '(key TEXT PRIMARY KEY, output TEXT NOT NULL)')
+        # Output is NULL for forms which must be tagged in context
+        self.connection.execute('CREATE TABLE IF NOT EXISTS forms '
+                                '(key TEXT PRIMARY KEY, output TEXT)')
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @staticmethod
+    def key(lang, line):
+        """Cache key of a tokenized sentence
+
+        Arguments:
+            lang {str} -- Language of the sentence
+            line {list} -- Tokens of the sentence
+
+        Returns:
+            str -- Hexadecimal digest of the language, tagger version and text
+        """
+        content = '\0'.join([lang, tagger_version(lang), ' '.join(line)])
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def form_key(lang, form):
+        """Cache key of a word form analysed alone"""
+        content = '\0'.join([lang, tagger_version(lang), 'form', form])
+        return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+    def get(self, keys, table='tagged'):
+        """Looks up tagged sentences, or forms if `table` is `forms`
+
+        Arguments:
+            keys {list} -- Keys computed by `key` or `form_key`
+
+        Returns:
+            dict -- Tagger output of each key found in the cache
+        """
+        keys = list(keys)
+        found = dict()
+        for i in range(0, len(keys), QUERY_SIZE):
+            query_keys = keys[i:i + QUERY_SIZE]
+            rows = self.connection.execute(
+                'SELECT key, output FROM {} WHERE key IN ({})'.format(
+                    table, ','.join('?' * len(query_keys))), query_keys)
+            found.update(rows)
+        return found
+
+    def put(self, items, table='tagged'):
+        """Stores tagged sentences, or forms if `table` is `forms`
+
+        Arguments:
+            items {list} -- Pairs (key, tagger output)
+        """
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO {} VALUES (?, ?)'.format(table), items)
+        self.connection.commit()
+
+    def get_forms(self, forms, lang, tagger_pool):
+        """Raw tagger output of each form analysed alone, tagging the forms
+        which are not cached yet
+
+        Arguments:
+            forms {set} -- Word forms
+            lang {str} -- Language of the forms
+            tagger_pool {TaggerPool} -- Worker processes running the taggers
+
+        Returns:
+            dict -- Output of each form, None if it must be tagged in context
+        """
+        forms = list(forms)
+        keys = [self.form_key(lang, form) for form in forms]
+        cached = self.get(keys, table='forms')
+
+        new_forms = [(key, form) for (key, form) in zip(keys, forms) if key not in cached]
+        new_items = list()
+        outputs = tagger_pool.imap([[form] for (_, form) in new_forms], lang, raw=True)
+        for ((key, form), (analysis, output)) in zip(new_forms, outputs):
+            units = analysis_units(analysis)
+            ambiguous = form in CONTEXT_FORMS or not units or any(
+                len(analyses) != 1 for (_, analyses) in units)
+            cached[key] = None if ambiguous else ' '.join(output.split())
+            new_items.append((key, cached[key]))
+        self.put(new_items, table='forms')
+
+        return {form: cached[key] for (key, form) in zip(keys, forms)}
+
+    def imap(self, lines, lang, tagger_pool):
+        """Tags sentences, sending to `tagger_pool` only those which are not cached
+        and cannot be assembled from cached forms. Repeated sentences are also
+        tagged only once
+
+        Arguments:
+            lines {list} -- Tokenized sentences
+            lang {str} -- Language of the sentences
+            tagger_pool {TaggerPool} -- Worker processes running the taggers
+
+        Yields:
+            str -- Each tagged sentence, in the same order as `lines`
+        """
+        keys = [self.key(lang, line) for line in lines]
+        tagged = self.get(set(keys))
+
+        missing = dict()
+        for (key, line) in zip(keys, lines):
+            if key not in tagged and key not in missing:
+                missing[key] = line
+
+        # Sentences made only of forms which do not depend on the context
+        # are assembled from the outputs of the forms, unless the analyser
+        # finds a multiword unit in them
+        form_outputs = self.get_forms(set(form for line in missing.values() for form in line),
+                                      lang, tagger_pool) if missing else dict()
+        candidates = [(key, line) for (key, line) in missing.items()
+                      if line and all(form_outputs[form] is not None for form in line)]
+        analyses = tagger_pool.imap([line for (_, line) in candidates], lang, analyse=True)
+        assembled = dict()
+        for ((key, line), analysis) in zip(candidates, analyses):
+            if not has_multiword(analysis):
+                assembled[key] = postprocess(' '.join(form_outputs[form] for form in line))
+        # In the order of the keys, as the outputs are read below
+        to_tag = [line for (key, line) in missing.items() if key not in assembled]
+        new_outputs = tagger_pool.imap(to_tag, lang, raw=True)
+
+        new_items = list()
+        try:
+            for key in keys:
+                if key not in tagged:
+                    if key in assembled:
+                        tagged[key] = assembled[key]
+                    else:
+                        tagged[key] = postprocess(next(new_outputs)[1])
+                    new_items.append((key, tagged[key]))
+                    if len(new_items) >= QUERY_SIZE:
+                        self.put(new_items)
+                        new_items = list()
+                yield tagged[key]
+        finally:
+            # Results are kept even if tagging is interrupted
+            self.put(new_items)
+
+    def close(self):
+        self.connection.close()
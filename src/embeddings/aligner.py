@@ -0,0 +1,121 @@
+import numpy as np
+from embeddings.index import normalize
+from readers.read_giza import Alignment, NO_ALIGNMENT
+
+# Minimum cosine similarity to align a MT word to its most similar source word
+# when they are not each other's most similar word
+ALIGN_THRESHOLD = 0.5
+
+
+def embeds_dim(embeds):
+    """Dimension of a set of embeddings, either an `Embeddings` or a dict of vectors"""
+    if hasattr(embeds, 'dim'):
+        return embeds.dim
+    return len(next(iter(embeds.values())))
+
+
+class EmbeddingAligner(object):
+    """Word aligner based on bilingual embeddings, an in-process alternative to MGIZA.
+
+    Each MT word is aligned to its most similar source word when the two are each
+    other's most similar word in the sentence pair, when their cosine similarity
+    is at least `threshold`, or when they are the same string (numbers, names,
+    punctuation). Other MT words are aligned to NULL, as GIZA does.
+    """
+
+    def __init__(self, emb_src, emb_sys, threshold=ALIGN_THRESHOLD):
+        self.emb_src = emb_src
+        self.emb_sys = emb_sys
+        self.threshold = threshold
+
+    @staticmethod
+    def _vectors(words, embeds):
+        """Normalized vectors of `words`, with null vectors for words without embedding
+
+        Returns:
+            tuple -- Matrix with one row per distinct word and the row of each word
+        """
+        word_ids = dict()
+        for word in words:
+            if word not in word_ids:
+                word_ids[word] = len(word_ids)
+
+        matrix = np.zeros((len(word_ids), embeds_dim(embeds)), dtype=np.float32)
+        for (word, i) in word_ids.items():
+            for form in [word, word.lower()]:
+                if form in embeds:
+                    matrix[i] = embeds[form]
+                    break
+        return normalize(matrix), word_ids
+
+    def align_pair(self, src, sys, src_vectors, sys_vectors):
+        """Aligns a sentence pair given the vectors of its words
+
+        Arguments:
+            src {list} -- Source tokens
+            sys {list} -- MT tokens
+            src_vectors {np.ndarray} -- Normalized vector of each source token
+            sys_vectors {np.ndarray} -- Normalized vector of each MT token
+
+        Returns:
+            Alignment -- Pairs in the same order as read from a GIZA A3 file
+        """
+        sys_to_src = np.full(len(sys), NO_ALIGNMENT, dtype=np.int32)
+        if len(src) and len(sys):
+            scores = src_vectors @ sys_vectors.T
+            same_word = np.equal.outer(np.array([w.lower() for w in src], dtype=object),
+                                       np.array([w.lower() for w in sys], dtype=object))
+            scores[same_word.astype(bool)] = 1
+
+            best_src = scores.argmax(axis=0)
+            best_sys = scores.argmax(axis=1)
+            best_scores = scores[best_src, np.arange(len(sys))]
+            mutual = best_sys[best_src] == np.arange(len(sys))
+            aligned = (mutual & (best_scores > 0)) | (best_scores >= self.threshold)
+            sys_to_src[aligned] = best_src[aligned]
+
+        # NULL first, then each source word with its MT words,
+        # or alone if it has none, as in GIZA A3 files
+        pairs_src = list()
+        pairs_sys = list()
+        for i in range(-1, len(src)):
+            sys_indices = np.flatnonzero(sys_to_src == (NO_ALIGNMENT if i == -1 else i))
+            if not sys_indices.size:
+                pairs_src.append(i)
+                pairs_sys.append(NO_ALIGNMENT)
+            else:
+                pairs_src.extend([NO_ALIGNMENT if i == -1 else i] * sys_indices.size)
+                pairs_sys.extend(sys_indices.tolist())
+        return Alignment.from_arrays(pairs_src, pairs_sys)
+
+    def align(self, src_lines, sys_lines):
+        """Aligns the sentence pairs
+
+        Arguments:
+            src_lines {list} -- Tokenized source sentences
+            sys_lines {list} -- Tokenized MT sentences
+
+        Returns:
+            list -- Aligned lines, with the same structure as `GIZAReader.aligned_lines`
+        """
+        src_matrix, src_ids = self._vectors([w for line in src_lines for w in line],
+                                            self.emb_src)
+        sys_matrix, sys_ids = self._vectors([w for line in sys_lines for w in line],
+                                            self.emb_sys)
+
+        aligned_lines = list()
+        for (num, (src, sys)) in enumerate(zip(src_lines, sys_lines)):
+            alignment = self.align_pair(src, sys,
+                                        src_matrix[[src_ids[w] for w in src]],
+                                        sys_matrix[[sys_ids[w] for w in sys]])
+            aligned_lines.append({'num': num,
+                                  'sys': sys,
+                                  'src': src,
+                                  'alignment': alignment})
+        return aligned_lines
+
+    def align_files(self, src_filename, sys_filename):
+        """Aligns the sentences of two tokenized files, one sentence per line"""
+        with open(src_filename, 'r') as src_file, open(sys_filename, 'r') as sys_file:
+            return self.align([line.split() for line in src_file],
+                              [line.split() for line in sys_file])
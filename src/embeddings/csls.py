@@ -0,0 +1,81 @@
+import argparse
+import os
+import numpy as np
+from embeddings.index import EmbeddingIndex
+from readers.read_muse_embeds import load_embeddings
+
+# Neighbours averaged in the hubness penalty of each word
+CSLS_K = 10
+
+
+def penalties_path(path):
+    """Path of the CSLS penalties of the words of an embeddings file"""
+    return path + '.csls.npy'
+
+
+def has_penalties(path, other_path):
+    """Checks whether the penalties saved next to `path` exist and are newer than
+    both embeddings files they were computed from
+    """
+    try:
+        mtime = os.path.getmtime(penalties_path(path))
+        return all(mtime >= os.path.getmtime(p) for p in [path, other_path])
+    except OSError:
+        return False
+
+
+def compute_penalties(index, other_index, k=CSLS_K):
+    """Mean cosine similarity of each word of `index` to its `k` nearest
+    neighbours in `other_index`, the r term of CSLS
+
+    Arguments:
+        index {EmbeddingIndex} -- Words to be penalized
+        other_index {EmbeddingIndex} -- Words of the other language, without penalties
+
+    Keyword Arguments:
+        k {int} -- Number of neighbours (default: {CSLS_K})
+
+    Returns:
+        np.ndarray -- float32 penalty of each word, in vocabulary order
+    """
+    _, scores = EmbeddingIndex.closest_batch(other_index, index.matrix.astype(np.float32), k=k)
+    return scores.mean(axis=1).astype(np.float32)
+
+
+def write_penalties(path, penalties):
+    with open(penalties_path(path) + '.tmp', 'wb') as _file:
+        np.save(_file, penalties)
+    os.replace(penalties_path(path) + '.tmp', penalties_path(path))
+
+
+def load_penalties(path):
+    return np.load(penalties_path(path))
+
+
+def precompute(path_en, path_pt, k=CSLS_K):
+    """Computes the CSLS penalties of both vocabularies and saves each one
+    next to its embeddings file
+
+    Arguments:
+        path_en {str} -- Path to the English MUSE file
+        path_pt {str} -- Path to the Portuguese MUSE file
+
+    Keyword Arguments:
+        k {int} -- Number of neighbours (default: {CSLS_K})
+    """
+    emb_en, emb_pt = load_embeddings(path_en, path_pt)
+    index_en = EmbeddingIndex(emb_en)
+    index_pt = EmbeddingIndex(emb_pt)
+    write_penalties(path_pt, compute_penalties(index_pt, index_en, k))
+    write_penalties(path_en, compute_penalties(index_en, index_pt, k))
+
+
+if __name__ == '__main__':
+    ARG_PARSER = argparse.ArgumentParser(
+        description='Precomputes the CSLS penalties of a pair of MUSE files')
+    ARG_PARSER.add_argument('path_en', help='Path to the English MUSE file')
+    ARG_PARSER.add_argument('path_pt', help='Path to the Portuguese MUSE file')
+    ARG_PARSER.add_argument('-k', type=int, default=CSLS_K,
+                            help='Neighbours averaged in each penalty')
+    FLAGS = ARG_PARSER.parse_args()
+    precompute(FLAGS.path_en, FLAGS.path_pt, FLAGS.k)
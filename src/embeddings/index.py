@@ -0,0 +1,302 @@
+import os
+import numpy as np
+from embeddings.store import Embeddings
+
+# Maximum size, in bytes, of the block of scores computed at once by
+# `EmbeddingIndex.closest_batch`
+MEMORY_BUDGET = 256 * 1024 ** 2
+
+# Types of the matrix of an `EmbeddingIndex`
+DTYPES = [np.float32, np.float16, np.int8]
+
+# Candidates scored on the quantized matrix for each word returned
+# when the search is re-ranked with float32 vectors
+RERANK_FACTOR = 4
+
+
+def normalize(matrix):
+    """L2-normalizes the last axis of `matrix`, leaving null vectors untouched
+
+    Arguments:
+        matrix {np.ndarray} -- Vector or matrix with one vector per row
+
+    Returns:
+        np.ndarray -- Normalized copy of `matrix`
+    """
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def quantize(matrix, dtype):
+    """Converts normalized float32 vectors to `dtype`.
+    int8 rows are scaled so that their largest absolute value is 127
+
+    Arguments:
+        matrix {np.ndarray} -- Normalized vectors, one per row
+        dtype {type} -- One of `DTYPES`
+
+    Returns:
+        tuple -- Converted matrix and the scale of each row, None unless `dtype` is int8
+    """
+    if np.dtype(dtype) != np.int8:
+        return matrix.astype(dtype), None
+    scales = np.abs(matrix).max(axis=1) / 127
+    scales[scales == 0] = 1
+    return np.rint(matrix / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+
+
+class EmbeddingIndex(object):
+    """Nearest neighbour search over a set of word embeddings.
+
+    The vocabulary is kept in a word array and the vectors in a L2-normalized
+    matrix, so the cosine similarity against every word is computed
+    by a single matrix-vector product.
+
+    The matrix is float32 by default. With float16, or int8 with one scale per
+    row, it takes a half or a quarter of the memory and the scores are computed
+    on the quantized vectors. `rerank` keeps a reference to the float32 vectors
+    of the embeddings, usually memory-mapped, to compute the exact scores of the
+    best candidates.
+
+    With the CSLS `penalties` of the vocabulary (see `embeddings.csls`), words
+    are ranked by `2 * cos - penalty` instead of by cosine, which keeps hub words
+    from being suggested for every query. The returned scores are then CSLS
+    scores, without the penalty of the query, which is the same for all words.
+    """
+
+    def __init__(self, embeds, dtype=np.float32, rerank=False, penalties=None):
+        self.words = np.array(list(embeds), dtype=object)
+        if isinstance(embeds, Embeddings):
+            self.word_ids = embeds.word_ids
+            matrix = embeds.matrix
+        else:
+            self.word_ids = {w: i for (i, w) in enumerate(self.words)}
+            matrix = np.array([embeds[w] for w in self.words], dtype=np.float32)
+        matrix = matrix.reshape(len(self.words), -1)
+
+        # Normalized and converted in blocks of rows, so that a quantized index
+        # never holds a float32 copy of the whole matrix
+        self.matrix = np.empty(matrix.shape, dtype=dtype)
+        self.scales = np.empty(len(matrix), dtype=np.float32) \
+            if np.dtype(dtype) == np.int8 else None
+        block_size = max(1, MEMORY_BUDGET // (4 * max(1, matrix.shape[1])))
+        for start in range(0, len(matrix), block_size):
+            block = normalize(np.asarray(matrix[start:start + block_size], dtype=np.float32))
+            block, scales = quantize(block, dtype)
+            self.matrix[start:start + block_size] = block
+            if scales is not None:
+                self.scales[start:start + block_size] = scales
+
+        self.rerank_matrix = matrix if rerank else None
+        self.penalties = None if penalties is None else np.asarray(penalties, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.words)
+
+    def save(self, path):
+        """Writes the index to `<path>.npy` (normalized matrix) and
+        `<path>.vocab` (one word per line). The row scales of an int8 index go to
+        `<path>.scales.npy`, the normalized float32 vectors of a re-ranked index
+        to `<path>.rerank.npy` and the CSLS penalties to `<path>.csls.npy`
+        """
+        with open(path + '.npy', 'wb') as _file:
+            np.save(_file, self.matrix)
+        with open(path + '.vocab', 'w', encoding='utf-8') as _file:
+            _file.write('\n'.join(self.words))
+        if self.scales is not None:
+            with open(path + '.scales.npy', 'wb') as _file:
+                np.save(_file, self.scales)
+        if self.penalties is not None:
+            with open(path + '.csls.npy', 'wb') as _file:
+                np.save(_file, self.penalties)
+        if self.rerank_matrix is not None:
+            rerank_matrix = np.lib.format.open_memmap(path + '.rerank.npy', mode='w+',
+                                                      dtype=np.float32,
+                                                      shape=self.rerank_matrix.shape)
+            block_size = max(1, MEMORY_BUDGET // (4 * max(1, rerank_matrix.shape[1])))
+            for start in range(0, len(rerank_matrix), block_size):
+                rerank_matrix[start:start + block_size] = normalize(np.asarray(
+                    self.rerank_matrix[start:start + block_size], dtype=np.float32))
+            rerank_matrix.flush()
+            del rerank_matrix
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """Reads an index written by `save`
+
+        Arguments:
+            path {str} -- Path given to `save`
+
+        Keyword Arguments:
+            mmap_mode {str} -- Passed to `np.load`; with 'r' the matrix is shared
+                               by all processes loading the same file (default: {None})
+
+        Returns:
+            EmbeddingIndex -- The loaded index
+        """
+        index = cls.__new__(cls)
+        with open(path + '.vocab', 'r', encoding='utf-8') as _file:
+            index.words = np.array(_file.read().split('\n'), dtype=object)
+        index.word_ids = {w: i for (i, w) in enumerate(index.words)}
+        index.matrix = np.load(path + '.npy', mmap_mode=mmap_mode)
+        index.scales = np.load(path + '.scales.npy', mmap_mode=mmap_mode) \
+            if os.path.isfile(path + '.scales.npy') else None
+        # The float32 vectors are only read for the candidates being re-ranked
+        index.rerank_matrix = np.load(path + '.rerank.npy', mmap_mode='r') \
+            if os.path.isfile(path + '.rerank.npy') else None
+        index.penalties = np.load(path + '.csls.npy') \
+            if os.path.isfile(path + '.csls.npy') else None
+        return index
+
+    def ignored_ids(self, words_to_ignore):
+        """Vocabulary indices of the words that must not be suggested
+
+        Arguments:
+            words_to_ignore {list} -- Words to be removed from the results
+
+        Returns:
+            list -- Indices of the words found in the vocabulary
+        """
+        if not words_to_ignore:
+            return list()
+        return [self.word_ids[w] for w in words_to_ignore if w in self.word_ids]
+
+    def row_scores(self, ids, queries):
+        """Scores of the rows `ids` of the matrix against normalized queries
+
+        Arguments:
+            ids {np.ndarray} -- Sorted vocabulary indices, or a slice
+            queries {np.ndarray} -- Normalized query matrix, or a single query
+
+        Returns:
+            np.ndarray -- Cosine similarities, or CSLS scores with penalties,
+                          with one column per row of `ids`
+        """
+        scores = np.asarray(queries, dtype=np.float32).dot(
+            np.asarray(self.matrix[ids], dtype=np.float32).T)
+        if self.scales is not None:
+            scores *= self.scales[ids]
+        return self.csls(scores, ids)
+
+    def csls(self, scores, ids):
+        """CSLS scores of the words `ids` from their cosine similarities `scores`.
+        Cosine similarities are returned unchanged if the index has no penalties
+        """
+        if self.penalties is None:
+            return scores
+        return 2 * scores - self.penalties[ids]
+
+    def scores(self, queries, memory_budget=MEMORY_BUDGET):
+        """Scores of normalized queries against the whole vocabulary.
+        A quantized matrix is converted in blocks of rows of at most `memory_budget` bytes
+        """
+        if self.matrix.dtype == np.float32 and self.scales is None:
+            return self.row_scores(slice(None), queries)
+
+        scores = np.empty(np.shape(queries)[:-1] + (len(self),), dtype=np.float32)
+        block_size = max(1, memory_budget // (4 * max(1, self.matrix.shape[1])))
+        for start in range(0, len(self), block_size):
+            rows = slice(start, start + block_size)
+            scores[..., rows] = self.row_scores(rows, queries)
+        return scores
+
+    def rerank(self, ids, query, k):
+        """Sorts candidates by the exact scores of their float32 vectors
+
+        Arguments:
+            ids {np.ndarray} -- Vocabulary indices of the candidates
+            query {np.ndarray} -- Normalized query
+            k {int} -- Number of candidates to keep
+
+        Returns:
+            tuple -- Arrays with the ids and scores of the `k` best candidates
+        """
+        order = np.argsort(ids)
+        vectors = normalize(np.asarray(self.rerank_matrix[ids[order]], dtype=np.float32))
+        scores = np.empty(len(ids), dtype=np.float32)
+        scores[order] = vectors.dot(query)
+        scores = self.csls(scores, ids)
+        top = np.argsort(-scores, kind='mergesort')[:k]
+        return ids[top], scores[top]
+
+    def closest(self, vector, k=5, words_to_ignore=None):
+        """Finds the `k` words closest to `vector` by cosine distance
+
+        Arguments:
+            vector {np.ndarray} -- Query vector, in the same space as the index
+
+        Keyword Arguments:
+            k {int} -- Number of words to return (default: {5})
+            words_to_ignore {list} -- Words that must not be returned (default: {None})
+
+        Returns:
+            list -- Pairs (word, cosine distance) sorted by distance,
+                    1 - CSLS score instead of the distance with penalties
+        """
+        k = min(k, len(self))
+        if k < 1:
+            return list()
+
+        query = normalize(np.asarray(vector, dtype=np.float32))
+        scores = self.scores(query)
+        scores[self.ignored_ids(words_to_ignore)] = -np.inf
+
+        num_candidates = k
+        if self.rerank_matrix is not None:
+            num_candidates = min(k * RERANK_FACTOR, len(self))
+        top = np.argpartition(-scores, num_candidates - 1)[:num_candidates]
+        if self.rerank_matrix is not None:
+            top, top_scores = self.rerank(top[np.isfinite(scores[top])], query, k)
+        else:
+            top = top[np.argsort(-scores[top])]
+            top_scores = scores[top]
+        return [(self.words[i], 1 - float(s)) for (i, s) in zip(top, top_scores)]
+
+    def closest_batch(self, vectors, k=5, memory_budget=MEMORY_BUDGET):
+        """Finds the `k` closest words of many query vectors at once.
+        Queries are scored in blocks of rows, so that each block of scores
+        fits in `memory_budget` bytes
+
+        Arguments:
+            vectors {np.ndarray} -- Query matrix, one vector per row
+
+        Keyword Arguments:
+            k {int} -- Number of words to return per query (default: {5})
+            memory_budget {int} -- Bytes available for each block of scores
+                                   (default: {MEMORY_BUDGET})
+
+        Returns:
+            tuple -- Arrays (ids, scores) with one row per query, each row
+                     holding vocabulary indices and cosine similarities, or CSLS
+                     scores with penalties, sorted from the closest word
+        """
+        queries = normalize(np.asarray(vectors, dtype=np.float32))
+        num_queries = len(queries)
+        k = min(k, len(self))
+
+        ids = np.empty((num_queries, k), dtype=np.int64)
+        scores = np.empty((num_queries, k), dtype=np.float32)
+        if k < 1:
+            return ids, scores
+
+        num_candidates = k
+        if self.rerank_matrix is not None:
+            num_candidates = min(k * RERANK_FACTOR, len(self))
+
+        block_size = max(1, memory_budget // (4 * len(self)))
+        for start in range(0, num_queries, block_size):
+            block = self.scores(queries[start:start + block_size], memory_budget)
+            rows = np.arange(len(block))[:, None]
+
+            top = np.argpartition(-block, num_candidates - 1, axis=1)[:, :num_candidates]
+            if self.rerank_matrix is not None:
+                for (i, candidates) in enumerate(top):
+                    ids[start + i], scores[start + i] = self.rerank(
+                        candidates, queries[start + i], k)
+                continue
+            top = top[rows, np.argsort(-block[rows, top], axis=1)]
+
+            ids[start:start + block_size] = top
+            scores[start:start + block_size] = block[rows, top]
+        return ids, scores
@@ -0,0 +1,316 @@
+import argparse
+import os
+import numpy as np
+from embeddings.index import EmbeddingIndex, MEMORY_BUDGET, RERANK_FACTOR, normalize
+from readers.read_muse_embeds import load_embeddings
+
+# Number of inverted lists searched per query by default
+NPROBE = 16
+# Iterations of k-means when training the coarse quantizer
+KMEANS_ITERATIONS = 10
+# Vectors sampled per list to train the coarse quantizer
+KMEANS_SAMPLES_PER_LIST = 256
+
+
+def ivf_paths(path):
+    """Paths of the inverted lists of an `IVFIndex`: the centroids, the word ids
+    sorted by list and the offset of each list in the ids
+
+    Arguments:
+        path {str} -- Path to the embeddings file, or given to `IVFIndex.save`
+
+    Returns:
+        tuple -- Paths to the centroids, ids and offsets files
+    """
+    return path + '.centroids.npy', path + '.lists.npy', path + '.offsets.npy'
+
+
+def has_lists(path):
+    """Checks whether the inverted lists saved next to `path` exist and are up to date
+    """
+    try:
+        mtime = os.path.getmtime(path)
+        return all(os.path.getmtime(p) >= mtime for p in ivf_paths(path))
+    except OSError:
+        return False
+
+
+def assign(matrix, centroids, memory_budget=MEMORY_BUDGET):
+    """Index of the closest centroid of each row of `matrix`, computed in blocks
+    of rows so that each block of scores fits in `memory_budget` bytes
+    """
+    lists = np.empty(len(matrix), dtype=np.int32)
+    block_size = max(1, memory_budget // (centroids.itemsize * len(centroids)))
+    for start in range(0, len(matrix), block_size):
+        block = np.asarray(matrix[start:start + block_size], dtype=np.float32)
+        lists[start:start + block_size] = block.dot(centroids.T).argmax(axis=1)
+    return lists
+
+
+def kmeans(matrix, n_lists, iterations=KMEANS_ITERATIONS, seed=0):
+    """Spherical k-means over a sample of the L2-normalized rows of `matrix`
+
+    Arguments:
+        matrix {np.ndarray} -- Normalized vectors, one per row, possibly quantized
+        n_lists {int} -- Number of centroids
+
+    Keyword Arguments:
+        iterations {int} -- Number of assignment and update steps (default: {KMEANS_ITERATIONS})
+        seed {int} -- Seed of the sample and of the initial centroids (default: {0})
+
+    Returns:
+        np.ndarray -- Normalized float32 centroids, one per row
+    """
+    rng = np.random.RandomState(seed)
+    num_samples = min(len(matrix), n_lists * KMEANS_SAMPLES_PER_LIST)
+    sample = np.sort(rng.choice(len(matrix), num_samples, replace=False))
+    sample = normalize(np.asarray(matrix[sample], dtype=np.float32))
+
+    centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+    for _ in range(iterations):
+        lists = assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, lists, sample)
+        counts = np.bincount(lists, minlength=n_lists)
+
+        # Empty lists restart from random vectors
+        empty = np.flatnonzero(counts == 0)
+        sums[empty] = sample[rng.choice(len(sample), len(empty), replace=False)]
+        centroids = normalize(sums)
+    return centroids
+
+
+class IVFIndex(EmbeddingIndex):
+    """Approximate nearest neighbour search with an inverted file index.
+
+    A k-means coarse quantizer splits the vocabulary into lists of words close
+    to the same centroid. A query only scores the words of the `nprobe` lists
+    whose centroids are closest to it, with the same scores as `EmbeddingIndex`,
+    so the results only differ when a neighbour is in a list that was not
+    searched. Larger `nprobe` values trade speed for recall.
+
+    Other keyword arguments, such as `dtype` and `rerank`, are passed to
+    `EmbeddingIndex`.
+    """
+
+    def __init__(self, embeds, n_lists=None, nprobe=NPROBE, seed=0, **kwargs):
+        EmbeddingIndex.__init__(self, embeds, **kwargs)
+        self.nprobe = nprobe
+        if n_lists is None:
+            n_lists = int(4 * np.sqrt(len(self)))
+        n_lists = max(1, min(n_lists, len(self)))
+        centroids = kmeans(self.matrix, n_lists, seed=seed)
+        self._set_lists(centroids, assign(self.matrix, centroids))
+
+    def _set_lists(self, centroids, lists):
+        self.centroids = centroids
+        self.list_ids = np.argsort(lists, kind='mergesort').astype(np.int32)
+        self.list_offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(lists, minlength=len(centroids)), out=self.list_offsets[1:])
+
+    @classmethod
+    def cached(cls, embeds, path, nprobe=NPROBE, **kwargs):
+        """Builds the index of the embeddings read from `path`. The inverted lists
+        are saved next to that file and only trained again when it changes
+
+        Arguments:
+            embeds {Embeddings} -- Embeddings read from `path`
+            path {str} -- Path to the embeddings file
+
+        Keyword Arguments:
+            nprobe {int} -- Lists searched per query (default: {NPROBE})
+            kwargs -- Passed to the constructor, `n_lists` and `seed` only being used
+                      when the lists are trained
+
+        Returns:
+            IVFIndex -- The index
+        """
+        if not has_lists(path):
+            index = cls(embeds, nprobe=nprobe, **kwargs)
+            try:
+                index.save_lists(path)
+            except OSError:
+                pass
+            return index
+
+        index = cls.__new__(cls)
+        kwargs.pop('n_lists', None)
+        kwargs.pop('seed', None)
+        EmbeddingIndex.__init__(index, embeds, **kwargs)
+        index.nprobe = nprobe
+        index.load_lists(path)
+        return index
+
+    def save(self, path):
+        """Writes the index as `EmbeddingIndex.save` does, plus its inverted lists
+        """
+        EmbeddingIndex.save(self, path)
+        self.save_lists(path)
+
+    def save_lists(self, path):
+        """Writes the inverted lists to the files of `ivf_paths`.
+        Each file is written to a temporary path then renamed
+        """
+        arrays = [self.centroids, self.list_ids, self.list_offsets]
+        for (array, array_path) in zip(arrays, ivf_paths(path)):
+            with open(array_path + '.tmp', 'wb') as _file:
+                np.save(_file, array)
+        for array_path in ivf_paths(path):
+            os.replace(array_path + '.tmp', array_path)
+
+    def load_lists(self, path, mmap_mode=None):
+        centroids_path, ids_path, offsets_path = ivf_paths(path)
+        self.centroids = np.load(centroids_path)
+        self.list_ids = np.load(ids_path, mmap_mode=mmap_mode)
+        self.list_offsets = np.load(offsets_path)
+
+    @classmethod
+    def load(cls, path, mmap_mode=None, nprobe=NPROBE):
+        """Reads an index written by `save`
+
+        Arguments:
+            path {str} -- Path given to `save`
+
+        Keyword Arguments:
+            mmap_mode {str} -- Passed to `np.load` (default: {None})
+            nprobe {int} -- Lists searched per query (default: {NPROBE})
+
+        Returns:
+            IVFIndex -- The loaded index
+        """
+        index = super(IVFIndex, cls).load(path, mmap_mode=mmap_mode)
+        index.nprobe = nprobe
+        index.load_lists(path, mmap_mode=mmap_mode)
+        return index
+
+    def candidates(self, query, nprobe=None):
+        """Ids of the words in the lists closest to a normalized query"""
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        centroid_scores = self.centroids.dot(query)
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        return np.concatenate([self.list_ids[self.list_offsets[i]:self.list_offsets[i + 1]]
+                               for i in probe])
+
+    def _search(self, query, k, ignored, nprobe):
+        """Top `k` (ids, scores) among the candidates of a normalized query.
+        None when the searched lists have less than `k` words to suggest
+        """
+        ids = self.candidates(query, nprobe)
+        if len(ignored):
+            ids = np.setdiff1d(ids, ignored, assume_unique=True)
+        if len(ids) < k:
+            return None
+
+        # Scores of the short list, read in vocabulary order
+        ids = np.sort(ids)
+        scores = self.row_scores(ids, query)
+        if self.rerank_matrix is not None:
+            num_candidates = min(k * RERANK_FACTOR, len(ids))
+            top = np.argpartition(-scores, num_candidates - 1)[:num_candidates]
+            return self.rerank(ids[top], query, k)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return ids[top], scores[top]
+
+    def closest(self, vector, k=5, words_to_ignore=None, nprobe=None):
+        """Finds the `k` words closest to `vector` in the `nprobe` closest lists.
+        Falls back to the exhaustive search if they do not have `k` words
+
+        Arguments:
+            vector {np.ndarray} -- Query vector, in the same space as the index
+
+        Keyword Arguments:
+            k {int} -- Number of words to return (default: {5})
+            words_to_ignore {list} -- Words that must not be returned (default: {None})
+            nprobe {int} -- Lists searched, `self.nprobe` if None (default: {None})
+
+        Returns:
+            list -- Pairs (word, cosine distance) sorted by distance,
+                    1 - CSLS score instead of the distance with penalties
+        """
+        k = min(k, len(self))
+        if k < 1:
+            return list()
+
+        query = normalize(np.asarray(vector, dtype=np.float32))
+        result = self._search(query, k, self.ignored_ids(words_to_ignore), nprobe)
+        if result is None:
+            return EmbeddingIndex.closest(self, vector, k, words_to_ignore)
+        return [(self.words[i], 1 - float(s)) for (i, s) in zip(*result)]
+
+    def closest_batch(self, vectors, k=5, memory_budget=MEMORY_BUDGET, nprobe=None):
+        """Finds the `k` closest words of many query vectors, each one searched
+        in its `nprobe` closest lists
+
+        Arguments:
+            vectors {np.ndarray} -- Query matrix, one vector per row
+
+        Keyword Arguments:
+            k {int} -- Number of words to return per query (default: {5})
+            memory_budget {int} -- Bytes available for the exhaustive fallback
+                                   (default: {MEMORY_BUDGET})
+            nprobe {int} -- Lists searched, `self.nprobe` if None (default: {None})
+
+        Returns:
+            tuple -- Arrays (ids, scores) as returned by `EmbeddingIndex.closest_batch`
+        """
+        queries = normalize(np.asarray(vectors, dtype=np.float32))
+        k = min(k, len(self))
+
+        ids = np.empty((len(queries), k), dtype=np.int64)
+        scores = np.empty((len(queries), k), dtype=np.float32)
+        if k < 1:
+            return ids, scores
+
+        no_ignored = np.empty(0, dtype=np.int64)
+        for (i, query) in enumerate(queries):
+            result = self._search(query, k, no_ignored, nprobe)
+            if result is None:
+                result = EmbeddingIndex.closest_batch(self, query[None], k, memory_budget)
+                result = result[0][0], result[1][0]
+            ids[i], scores[i] = result
+        return ids, scores
+
+
+def recall(index, vectors, k=5, nprobe=None):
+    """Agreement of the approximate search of `index` with the exhaustive one
+
+    Arguments:
+        index {IVFIndex} -- Index to evaluate
+        vectors {np.ndarray} -- Query matrix, one vector per row
+
+    Keyword Arguments:
+        k {int} -- Number of words returned per query (default: {5})
+        nprobe {int} -- Lists searched, `index.nprobe` if None (default: {None})
+
+    Returns:
+        tuple -- Recall at `k`, the fraction of the exhaustive `k` best words that
+                 were found, and the fraction of queries with the same best word
+    """
+    exact_ids, _ = EmbeddingIndex.closest_batch(index, vectors, k)
+    ids, _ = index.closest_batch(vectors, k, nprobe=nprobe)
+    found = sum(len(np.intersect1d(a, b)) for (a, b) in zip(exact_ids, ids))
+    return found / exact_ids.size, float(np.mean(exact_ids[:, 0] == ids[:, 0]))
+
+
+if __name__ == '__main__':
+    ARG_PARSER = argparse.ArgumentParser(
+        description='Measures the recall of the inverted lists of a Portuguese MUSE file, '
+                    'with English words as queries')
+    ARG_PARSER.add_argument('path_en', help='Path to the English MUSE file')
+    ARG_PARSER.add_argument('path_pt', help='Path to the Portuguese MUSE file')
+    ARG_PARSER.add_argument('--queries', '-q', type=int, default=1000,
+                            help='Number of English words sampled as queries')
+    ARG_PARSER.add_argument('--nprobe', type=int, nargs='+', default=[NPROBE],
+                            help='Numbers of lists searched per query')
+    ARG_PARSER.add_argument('-k', type=int, default=5, help='Words returned per query')
+    FLAGS = ARG_PARSER.parse_args()
+
+    EMB_EN, EMB_PT = load_embeddings(FLAGS.path_en, FLAGS.path_pt)
+    INDEX = IVFIndex.cached(EMB_PT, FLAGS.path_pt)
+    SAMPLE = np.random.RandomState(0).choice(len(EMB_EN), min(FLAGS.queries, len(EMB_EN)),
+                                             replace=False)
+    QUERIES = np.asarray(EMB_EN.matrix[np.sort(SAMPLE)], dtype=np.float32)
+    for NPROBE_VALUE in FLAGS.nprobe:
+        print('nprobe {}: recall@{} {:.3f}, top-1 agreement {:.3f}'.format(
+            NPROBE_VALUE, FLAGS.k, *recall(INDEX, QUERIES, FLAGS.k, NPROBE_VALUE)))
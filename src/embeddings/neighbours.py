@@ -0,0 +1,231 @@
+import argparse
+import os
+import numpy as np
+from embeddings.index import EmbeddingIndex
+from embeddings.csls import has_penalties, load_penalties, penalties_path
+from readers.read_muse_embeds import load_embeddings
+
+# Suggestions returned per word
+NEIGHBOURS_K = 5
+# Candidates kept beyond `NEIGHBOURS_K`, so the suggestions are still complete
+# after the words to ignore are removed
+EXTRA_CANDIDATES = 5
+# English words searched in each pass over the Portuguese matrix
+BLOCK_SIZE = 10000
+# Scoring modes of a table, saved with it
+CSLS, COSINE = 'csls', 'cosine'
+
+
+def table_paths(path_en):
+    """Paths of the neighbour table of an English embeddings file: the ids and
+    scores of the Portuguese neighbours of each row, the English word of each row
+    and the scoring mode of the table
+
+    Arguments:
+        path_en {str} -- Path to the English embeddings file
+
+    Returns:
+        tuple -- Paths to the ids, scores, vocabulary and mode files
+    """
+    return (path_en + '.neighbours.npy', path_en + '.neighbour_scores.npy',
+            path_en + '.neighbours.vocab', path_en + '.neighbours.mode')
+
+
+def read_mode(path_en):
+    """Scoring mode of the table of `path_en`, `CSLS` or `COSINE`"""
+    with open(table_paths(path_en)[3], 'r', encoding='utf-8') as _file:
+        return _file.read().strip()
+
+
+def has_table(path_en, path_pt, csls=False):
+    """Checks whether the neighbour table of `path_en` exists, is newer than
+    both embeddings files and the CSLS penalties it may have used, and ranks
+    words as the search it replaces
+
+    Arguments:
+        path_en {str} -- Path to the English embeddings file
+        path_pt {str} -- Path to the Portuguese embeddings file
+
+    Keyword Arguments:
+        csls {bool} -- Whether the search ranks words by CSLS (default: {False})
+
+    Returns:
+        bool -- Whether the table can be used
+    """
+    sources = [path_en, path_pt, penalties_path(path_pt)]
+    try:
+        mtime = min(os.path.getmtime(p) for p in table_paths(path_en))
+        if not all(mtime >= os.path.getmtime(p) for p in sources if os.path.exists(p)):
+            return False
+        return read_mode(path_en) == (CSLS if csls else COSINE)
+    except OSError:
+        return False
+
+
+class NeighbourTable(object):
+    """Portuguese neighbours of English words, computed beforehand by `precompute`.
+
+    Each row holds the ids and scores of the `width` best Portuguese words of an
+    English word, sorted from the closest. Rows are found through a dict, so a
+    lookup does not depend on the size of the vocabularies.
+
+    Tables are computed with an exact float32 search, ranking words by CSLS or
+    by cosine as given by `mode`. Words outside the table are searched with the
+    index configured for the suggestions, which may be approximate, so their
+    suggestions may differ from those the table would give.
+    """
+
+    def __init__(self, en_words, ids, scores, pt_words, mode=COSINE):
+        self.en_words = en_words
+        self.row_ids = {w: i for (i, w) in enumerate(en_words)}
+        self.ids = ids
+        self.scores = scores
+        self.pt_words = pt_words
+        self.mode = mode
+
+    @property
+    def width(self):
+        return self.ids.shape[1]
+
+    def __contains__(self, word):
+        return word in self.row_ids
+
+    @classmethod
+    def load(cls, path_en, pt_words, mmap_mode='r'):
+        """Reads the table of an English embeddings file
+
+        Arguments:
+            path_en {str} -- Path to the English embeddings file
+            pt_words {list} -- Portuguese vocabulary, in the order of the embeddings file
+
+        Keyword Arguments:
+            mmap_mode {str} -- Passed to `np.load` (default: {'r'})
+
+        Returns:
+            NeighbourTable -- The table
+        """
+        ids_path, scores_path, vocab_path, _ = table_paths(path_en)
+        with open(vocab_path, 'r', encoding='utf-8') as _file:
+            en_words = _file.read().split('\n')
+        return cls(en_words, np.load(ids_path, mmap_mode=mmap_mode),
+                   np.load(scores_path, mmap_mode=mmap_mode), pt_words, read_mode(path_en))
+
+    def lookup(self, word, words_to_ignore=None, k=NEIGHBOURS_K):
+        """Suggestions of an English word, in the format of `closest_words`
+
+        Arguments:
+            word {str} -- English word
+
+        Keyword Arguments:
+            words_to_ignore {list} -- Words that must not be suggested (default: {None})
+            k {int} -- Number of suggestions (default: {NEIGHBOURS_K})
+
+        Returns:
+            list -- Pairs (word, distance), None if the word is not in the table or
+                    if too many of its candidates are ignored
+        """
+        row = self.row_ids.get(word)
+        if row is None:
+            return None
+        candidates = [(self.pt_words[i], 1 - float(s))
+                      for (i, s) in zip(self.ids[row].tolist(), self.scores[row].tolist())]
+        if words_to_ignore:
+            candidates = [c for c in candidates if c[0] not in words_to_ignore]
+        if len(candidates) < min(k, self.width):
+            return None
+        return candidates[:k]
+
+    def suggestions(self, words):
+        """Candidates of the words in the table, as returned by `closest_words_batch`.
+        Each word gets its whole row, `width` candidates, so the ignored words
+        can be removed by `filter_candidates`
+
+        Arguments:
+            words {iterable} -- English words
+
+        Returns:
+            dict -- Candidates of each word found in the table
+        """
+        return {w: self.lookup(w, k=self.width) for w in set(words) if w in self.row_ids}
+
+    def short_words(self, queries, k=NEIGHBOURS_K):
+        """Words of the table whose row has less than `k` candidates left once the
+        words to ignore of some query are removed. Those queries must be searched
+
+        Arguments:
+            queries {iterable} -- Pairs (English word, words to ignore)
+
+        Keyword Arguments:
+            k {int} -- Number of suggestions per query (default: {NEIGHBOURS_K})
+
+        Returns:
+            set -- The words
+        """
+        return set(word for (word, words_to_ignore) in queries
+                   if word in self.row_ids and self.lookup(word, words_to_ignore, k) is None)
+
+
+def precompute(path_en, path_pt, num_words=None, k=NEIGHBOURS_K, extra=EXTRA_CANDIDATES,
+               block_size=BLOCK_SIZE, csls=True):
+    """Computes the table of the first `num_words` English words, the most frequent
+    ones in MUSE files, searching `block_size` words per pass over the Portuguese
+    matrix. With `csls`, words are ranked by CSLS if the penalties of `path_pt`
+    are up to date. The scoring mode used is saved with the table
+
+    Arguments:
+        path_en {str} -- Path to the English MUSE file
+        path_pt {str} -- Path to the Portuguese MUSE file
+
+    Keyword Arguments:
+        num_words {int} -- Number of English words, all if None (default: {None})
+        k {int} -- Suggestions per word (default: {NEIGHBOURS_K})
+        extra {int} -- Extra candidates per word (default: {EXTRA_CANDIDATES})
+        block_size {int} -- English words per pass (default: {BLOCK_SIZE})
+        csls {bool} -- Rank words by CSLS when possible (default: {True})
+    """
+    emb_en, emb_pt = load_embeddings(path_en, path_pt)
+    penalties = load_penalties(path_pt) \
+        if csls and has_penalties(path_pt, path_en) else None
+    index_pt = EmbeddingIndex(emb_pt, penalties=penalties)
+
+    num_words = len(emb_en) if num_words is None else min(num_words, len(emb_en))
+    width = min(k + extra, len(index_pt))
+    ids_path, scores_path, vocab_path, mode_path = table_paths(path_en)
+
+    ids = np.lib.format.open_memmap(ids_path + '.tmp', mode='w+', dtype=np.int32,
+                                    shape=(num_words, width))
+    scores = np.lib.format.open_memmap(scores_path + '.tmp', mode='w+', dtype=np.float16,
+                                       shape=(num_words, width))
+    for start in range(0, num_words, block_size):
+        stop = min(start + block_size, num_words)
+        block_ids, block_scores = index_pt.closest_batch(emb_en.matrix[start:stop], k=width)
+        ids[start:stop] = block_ids
+        scores[start:stop] = block_scores
+    ids.flush()
+    scores.flush()
+    del ids, scores
+
+    with open(vocab_path + '.tmp', 'w', encoding='utf-8') as _file:
+        _file.write('\n'.join(emb_en.words[:num_words]))
+    with open(mode_path + '.tmp', 'w', encoding='utf-8') as _file:
+        _file.write(COSINE if penalties is None else CSLS)
+    for table_path in table_paths(path_en):
+        os.replace(table_path + '.tmp', table_path)
+
+
+if __name__ == '__main__':
+    ARG_PARSER = argparse.ArgumentParser(
+        description='Precomputes the Portuguese neighbours of the English words of MUSE files')
+    ARG_PARSER.add_argument('path_en', help='Path to the English MUSE file')
+    ARG_PARSER.add_argument('path_pt', help='Path to the Portuguese MUSE file')
+    ARG_PARSER.add_argument('--words', '-n', type=int, default=None,
+                            help='Number of most frequent English words, all by default')
+    ARG_PARSER.add_argument('-k', type=int, default=NEIGHBOURS_K,
+                            help='Suggestions per word')
+    ARG_PARSER.add_argument('--extra', type=int, default=EXTRA_CANDIDATES,
+                            help='Candidates kept beyond the suggestions, for ignored words')
+    ARG_PARSER.add_argument('--cosine', action='store_true',
+                            help='Rank words by cosine even if there are CSLS penalties')
+    FLAGS = ARG_PARSER.parse_args()
+    precompute(FLAGS.path_en, FLAGS.path_pt, FLAGS.words, FLAGS.k, FLAGS.extra,
+               csls=not FLAGS.cosine)
@@ -0,0 +1,27 @@
+class Embeddings(object):
+    """Word embeddings kept as a single matrix with one row per word.
+
+    Behaves as the read-only dict of vectors previously built by the readers,
+    while the matrix itself may be memory-mapped from a binary cache file.
+    """
+
+    def __init__(self, words, matrix):
+        self.words = words
+        self.matrix = matrix
+        self.word_ids = {w: i for (i, w) in enumerate(words)}
+
+    def __getitem__(self, word):
+        return self.matrix[self.word_ids[word]]
+
+    def __contains__(self, word):
+        return word in self.word_ids
+
+    def __iter__(self):
+        return iter(self.words)
+
+    def __len__(self):
+        return len(self.words)
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
@@ -0,0 +1,193 @@
+import threading
+import numpy as np
+from embeddings.index import EmbeddingIndex, MEMORY_BUDGET, RERANK_FACTOR, normalize
+
+# Pairs (number of most frequent words, minimum best score). The search stops
+# after a tier if its best candidate reaches the score, otherwise it goes on
+# with the next tier and finally with the whole vocabulary
+TIERS = [(20000, 0.5), (100000, 0.4)]
+# Words to ignore that may be among the best candidates of a tier for it to answer
+MAX_REMOVED = 2
+
+
+class TieredIndex(EmbeddingIndex):
+    """Nearest neighbour search that scores the most frequent words first.
+
+    MUSE files are sorted by frequency, so the first rows of the matrix are the
+    most frequent words. Each query scores the words of the first tier, and only
+    scores the rows of the next tier when its best score is under the threshold
+    of the tier, or when more than `max_removed` of its `k` best candidates had
+    to be removed because they are words to ignore.
+
+    Scores are the same as in `EmbeddingIndex`, so thresholds apply to CSLS
+    scores when the index has penalties. The number of queries answered by each
+    tier is counted, see `report`.
+    """
+
+    def __init__(self, embeds, tiers=TIERS, max_removed=MAX_REMOVED, **kwargs):
+        EmbeddingIndex.__init__(self, embeds, **kwargs)
+        self.set_tiers(tiers, max_removed)
+
+    def set_tiers(self, tiers, max_removed=MAX_REMOVED):
+        """Sets the tiers and resets the counts of answered queries
+
+        Arguments:
+            tiers {list} -- Pairs (size, threshold), see `TIERS`
+
+        Keyword Arguments:
+            max_removed {int} -- See `MAX_REMOVED` (default: {MAX_REMOVED})
+        """
+        self.max_removed = max_removed
+        self.tiers = [(size, threshold) for (size, threshold) in sorted(tiers)
+                      if size < len(self)]
+        self.tiers.append((len(self), None))
+        self.tier_counts = [0] * len(self.tiers)
+        self._counts_lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path, mmap_mode=None, tiers=TIERS, max_removed=MAX_REMOVED):
+        """Reads an index written by `save`, see `EmbeddingIndex.load`"""
+        index = super(TieredIndex, cls).load(path, mmap_mode=mmap_mode)
+        index.set_tiers(tiers, max_removed)
+        return index
+
+    def _count(self, tier_ids):
+        with self._counts_lock:
+            for tier in tier_ids:
+                self.tier_counts[tier] += 1
+
+    def add_counts(self, counts):
+        """Adds the counts of answered queries of another copy of the index,
+        such as one loaded by a worker process
+
+        Arguments:
+            counts {list} -- Queries answered by each tier, as in `tier_counts`
+        """
+        with self._counts_lock:
+            for (tier, count) in enumerate(counts):
+                self.tier_counts[tier] += count
+
+    def report(self):
+        """Number of queries answered by each tier, one line per tier
+
+        Returns:
+            str -- The report
+        """
+        lines = list()
+        for ((size, threshold), count) in zip(self.tiers, self.tier_counts):
+            if threshold is None:
+                name = 'All {} words'.format(size)
+            else:
+                name = 'Top {} words, threshold {:.2f}'.format(size, threshold)
+            lines.append('{}: {} queries'.format(name, count))
+        return '\n'.join(lines)
+
+    def _tier_scores(self, queries, start, stop):
+        """Scores of normalized queries against the rows [start, stop), in blocks
+        of rows whose float32 vectors and scores take at most `MEMORY_BUDGET` bytes
+        """
+        scores = np.empty((len(queries), stop - start), dtype=np.float32)
+        block_size = max(1, MEMORY_BUDGET // (4 * (self.matrix.shape[1] + len(queries))))
+        for block_start in range(start, stop, block_size):
+            rows = slice(block_start, min(block_start + block_size, stop))
+            scores[:, rows.start - start:rows.stop - start] = self.row_scores(rows, queries)
+        return scores
+
+    def search(self, queries, k, ignored=None):
+        """Tiered search of normalized queries
+
+        Arguments:
+            queries {np.ndarray} -- Normalized query matrix
+            k {int} -- Number of words to return per query
+
+        Keyword Arguments:
+            ignored {list} -- Vocabulary indices that must not be returned (default: {None})
+
+        Returns:
+            tuple -- Arrays (ids, scores) sorted from the closest word, with one row
+                     per query and -inf scores when less than `k` words were found,
+                     and the tier that answered each query
+        """
+        num_candidates = k
+        if self.rerank_matrix is not None:
+            num_candidates = min(k * RERANK_FACTOR, len(self))
+        ignored = np.array(ignored if ignored else list(), dtype=np.int64)
+
+        # Best candidates found so far, padded with -inf scores
+        best_ids = np.full((len(queries), num_candidates), -1, dtype=np.int64)
+        best_scores = np.full((len(queries), num_candidates), -np.inf, dtype=np.float32)
+        # Scores of the words to ignore, to know how many were among the best ones
+        ignored_scores = np.full((len(queries), len(ignored)), -np.inf, dtype=np.float32)
+        query_tiers = np.zeros(len(queries), dtype=np.int64)
+        pending = np.arange(len(queries))
+        start = 0
+        for (tier, (size, threshold)) in enumerate(self.tiers):
+            if not len(pending) or size <= start:
+                continue
+            scores = self._tier_scores(queries[pending], start, size)
+            in_tier = (ignored >= start) & (ignored < size)
+            tier_ignored = ignored[in_tier] - start
+            ignored_scores[pending[:, None], np.flatnonzero(in_tier)] = scores[:, tier_ignored]
+            scores[:, tier_ignored] = -np.inf
+
+            # Best candidates of the tier, merged with those of the previous tiers
+            n = min(num_candidates, size - start)
+            top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+            rows = np.arange(len(pending))[:, None]
+            ids = np.hstack((best_ids[pending], top + start))
+            merged = np.hstack((best_scores[pending], scores[rows, top]))
+            order = np.argsort(-merged, axis=1, kind='mergesort')[:, :num_candidates]
+            best_ids[pending] = ids[rows, order]
+            best_scores[pending] = merged[rows, order]
+            query_tiers[pending] = tier
+            start = size
+
+            # Queries with k words to suggest, a confident best one and not too many
+            # ignored words among the best ones are answered
+            if threshold is not None:
+                kth_scores = best_scores[pending, k - 1]
+                enough = np.isfinite(kth_scores)
+                confident = best_scores[pending, 0] >= threshold
+                removed = (ignored_scores[pending] >= kth_scores[:, None]).sum(axis=1)
+                pending = pending[~(enough & confident & (removed <= self.max_removed))]
+
+        if self.rerank_matrix is not None:
+            for (i, query) in enumerate(queries):
+                found = np.isfinite(best_scores[i])
+                reranked_ids, reranked_scores = self.rerank(best_ids[i, found], query, k)
+                best_ids[i] = -1
+                best_scores[i] = -np.inf
+                best_ids[i, :len(reranked_ids)] = reranked_ids
+                best_scores[i, :len(reranked_scores)] = reranked_scores
+        self._count(query_tiers.tolist())
+        return best_ids[:, :k], best_scores[:, :k], query_tiers
+
+    def closest(self, vector, k=5, words_to_ignore=None):
+        """Finds the `k` words closest to `vector`, see `EmbeddingIndex.closest`"""
+        k = min(k, len(self))
+        if k < 1:
+            return list()
+
+        query = normalize(np.asarray(vector, dtype=np.float32))[None]
+        ids, scores, _ = self.search(query, k, self.ignored_ids(words_to_ignore))
+        return [(self.words[i], 1 - float(s))
+                for (i, s) in zip(ids[0], scores[0]) if np.isfinite(s)]
+
+    def closest_batch(self, vectors, k=5, memory_budget=MEMORY_BUDGET):
+        """Finds the `k` closest words of many query vectors,
+        see `EmbeddingIndex.closest_batch`
+        """
+        queries = normalize(np.asarray(vectors, dtype=np.float32))
+        k = min(k, len(self))
+        if k < 1 or not len(queries):
+            return (np.empty((len(queries), max(k, 0)), dtype=np.int64),
+                    np.empty((len(queries), max(k, 0)), dtype=np.float32))
+
+        # Blocks of queries, so that the scores of a tier fit in `memory_budget` bytes
+        block_size = max(1, memory_budget // (4 * len(self)))
+        ids, scores = list(), list()
+        for start in range(0, len(queries), block_size):
+            block_ids, block_scores, _ = self.search(queries[start:start + block_size], k)
+            ids.append(block_ids)
+            scores.append(block_scores)
+        return np.vstack(ids), np.vstack(scores)
@@ -1,10 +1,11 @@
 import tempfile
 import os
+import shutil
 import subprocess
 import re
 import random
 import string
-import pandas as pd
+import numpy as np
 from sklearn.preprocessing import LabelEncoder
 from sklearn.multiclass import OneVsRestClassifier
 from sklearn.tree import DecisionTreeClassifier
@@ -14,24 +15,41 @@ from sklearn.ensemble import RandomForestClassifier
 from sklearn.naive_bayes import BernoulliNB
 from readers.read_blast import BlastReader
 from readers.read_giza import GIZAReader
+from readers.read_muse_embeds import load_embeddings
+from embeddings.aligner import EmbeddingAligner
+from error_identification.features import FeatureEncoder, SentenceProfile
+from apertium.apertium_tagger import TaggerPool
+from apertium.tagger_cache import TaggerCache
+
+# Number of windows classified at once by `ErrorIdentification.classify`
+CLASSIFY_BATCH_SIZE = 5000
 
 
 class ErrorIdentification(object):
 
-    def __init__(self):
+    def __init__(self, embeddings_paths=None):
         self.tw_size = 5
         self.model_step1 = None
         self.model_step2 = None
         self.features = list()
+        self.encoder = None
         self.lb_step1 = LabelEncoder()
         self.lb_step2 = LabelEncoder()
+        self.aligner_model = dict()
+        # Paths to the (English, Portuguese) MUSE embeddings. When set, sentences are
+        # aligned with an `EmbeddingAligner` instead of MGIZA
+        self.embeddings_paths = embeddings_paths
         self.stop = False
 
     def train(self, blast_filename, model_type, error_types=None):
         blast_reader = BlastReader(blast_filename)
         src_lines = list()
         sys_lines = list()
-        target = list()
+
+        # Each sentence is tagged and aligned once, even if it has several errors.
+        # Instances are pairs (index of the sentence in src_lines, target)
+        sentence_index = dict()
+        instances = list()
 
         # Files for GIZA
         src_fd, src_filename = tempfile.mkstemp(text=True)
@@ -39,19 +57,24 @@ class ErrorIdentification(object):
         src_file = open(src_filename, 'w')
         sys_file = open(sys_filename, 'w')
 
+        def add_sentence(line):
+            if line not in sentence_index:
+                sentence_index[line] = len(src_lines)
+                src_lines.append(blast_reader.src_lines[line])
+                sys_lines.append(blast_reader.sys_lines[line])
+
+                # Write files for GIZA
+                src_file.write(' '.join(blast_reader.src_lines[line]))
+                src_file.write('\n')
+                sys_file.write(' '.join(blast_reader.sys_lines[line]))
+                sys_file.write('\n')
+            return sentence_index[line]
+
         # Correct sentences
         for i in blast_reader.get_correct_indices():
             if self.stop:
                 break
-            src_lines.append(blast_reader.src_lines[i])
-            sys_lines.append(blast_reader.sys_lines[i])
-            target.append('correct')
-
-            # Write files for GIZA
-            src_file.write(' '.join(blast_reader.src_lines[i]))
-            src_file.write('\n')
-            sys_file.write(' '.join(blast_reader.sys_lines[i]))
-            sys_file.write('\n')
+            instances.append((add_sentence(i), 'correct'))
 
         # Error sentences
         errors = blast_reader.get_filtered_errors(
@@ -59,14 +82,7 @@ class ErrorIdentification(object):
         for (line, error) in errors:
             if self.stop:
                 break
-            src_lines.append(blast_reader.src_lines[line])
-            sys_lines.append(blast_reader.sys_lines[line])
-            target.append(error)
-
-            src_file.write(' '.join(blast_reader.src_lines[line]))
-            src_file.write('\n')
-            sys_file.write(' '.join(blast_reader.sys_lines[line]))
-            sys_file.write('\n')
+            instances.append((add_sentence(line), error))
         src_file.close()
         sys_file.close()
         os.close(src_fd)
@@ -78,29 +94,36 @@ class ErrorIdentification(object):
 
         # Align sentences
         if not self.stop:
-            alignments = self.align_sentences(src_filename, sys_filename)
+            alignments = self.align_sentences(src_filename, sys_filename,
+                                              train_aligner=True)
 
-        # Extract features
+        # Extract features, sharing the profile of a sentence between its instances
         training_instances = list()
-        for (i, sent) in enumerate(tagged_lines):
+        profiles = dict()
+        for (i, target) in instances:
             if self.stop:
                 break
-            features = self.extract_features(sent,
+            if i not in profiles:
+                profiles[i] = SentenceProfile(tagged_lines[i])
+            features = self.extract_features(tagged_lines[i],
                                              alignments[i]['alignment'],
                                              self.tw_size,
-                                             target[i])
+                                             target,
+                                             profiles[i])
             if features:
                 training_instances.append(features)
 
         if not self.stop:
-            data = self.format_features(training_instances)
+            self.encoder = FeatureEncoder()
+            X = self.encoder.fit_transform(training_instances)
+            y = self.format_target(training_instances)
 
         if not self.stop:
-            self.features = list(data)
-            self.model_step1 = self.train_model(data.copy(),
+            self.features = list(self.encoder.columns)
+            self.model_step1 = self.train_model(X, y,
                                                 model_type,
                                                 step1=True)
-            self.model_step2 = self.train_model(data.copy(),
+            self.model_step2 = self.train_model(X, y,
                                                 model_type,
                                                 step1=False)
 
@@ -114,8 +137,9 @@ class ErrorIdentification(object):
         Returns:
             list -- List of tuples with aligned tagged lines. Tags are in a list
         """
-        src_out = self.run_apertium_tagger(src, 'en')
-        sys_out = self.run_apertium_tagger(sys, 'pt')
+        with TaggerPool() as tagger_pool, TaggerCache() as tagger_cache:
+            src_out = self.run_apertium_tagger(src, 'en', tagger_pool, tagger_cache)
+            sys_out = self.run_apertium_tagger(sys, 'pt', tagger_pool, tagger_cache)
 
         num_sents = len(src_out)
         src_tags = list()
@@ -137,75 +161,129 @@ class ErrorIdentification(object):
 
         return list(zip(src_tags, sys_tags))
 
-    def run_apertium_tagger(self, lines, lang):
-        """Creates a subprocess to run the Apertium Tagger via the `apertium/parse_file.sh` script
+    def run_apertium_tagger(self, lines, lang, tagger_pool, tagger_cache):
+        """Tags the lines with the long-lived Apertium taggers of `tagger_pool`,
+        which produce the same output as the `apertium/parse_file.sh` script.
+        Lines already in `tagger_cache` are not tagged again
 
         Arguments:
             lines {list} -- List of lines to be tagged
             lang {str} -- Language to run the tagger with
+            tagger_pool {TaggerPool} -- Worker processes running the taggers
+            tagger_cache {TaggerCache} -- Cache of previously tagged lines
 
         Returns:
             list -- Returns a list with all tagged lines in the Apertium format
         """
-        apertium_script_path = 'src/apertium/parse_file.sh'
         out_lines = list()
 
-        for line in lines:
+        for out in tagger_cache.imap(lines, lang, tagger_pool):
             if self.stop:
                 break
-            proc = subprocess.Popen([apertium_script_path, '--lang', lang],
-                                    stdin=subprocess.PIPE, universal_newlines=True,
-                                    stdout=subprocess.PIPE)
-            out = proc.communicate(' '.join(line))
-            out_lines.append(out[0])
+            out_lines.append(out)
         return out_lines
 
-    def align_sentences(self, src, sys):
+    def align_sentences(self, src, sys, train_aligner=False):
+        """Aligns the words of the sentences in src and sys with MGIZA,
+        or with the embeddings in `embeddings_paths` if they are set.
+        When training MGIZA, the vocabularies, word classes and parameters of the aligner
+        are kept in `aligner_model`. Otherwise, if there is a trained aligner,
+        it is used to align the sentences without training a new one
+
+        Arguments:
+            src {str} -- Path to the source language file
+            sys {str} -- Path to the Machine Translation output file
+
+        Keyword Arguments:
+            train_aligner {bool} -- Whether to keep the trained aligner (default: {False})
+
+        Returns:
+            list -- Aligned lines, as read by `GIZAReader`
+        """
+        # Models saved before the embedding aligner have no `embeddings_paths`
+        embeddings_paths = getattr(self, 'embeddings_paths', None)
+        if embeddings_paths:
+            aligner = EmbeddingAligner(*load_embeddings(*embeddings_paths))
+            return aligner.align_files(src, sys)
+
         giza_script_path = 'src/aligner/align_sentences.sh'
-        proc = subprocess.Popen([giza_script_path,
-                                 '--srcpath', src,
-                                 '--syspath', sys],
-                                stdout=subprocess.PIPE)
-        out = proc.communicate()
-        num_sents = int(out[0])
-        giza_reader = GIZAReader('/tmp/giza.output')
+
+        # Every call has its own workspace, so alignments can run concurrently
+        workdir = tempfile.mkdtemp()
+        model_dir = os.path.join(workdir, 'model')
+        os.mkdir(model_dir)
+        args = [giza_script_path, '--srcpath', src, '--syspath', sys,
+                '--workdir', workdir]
+
+        # Models saved before the aligner was kept have no `aligner_model`
+        aligner_model = getattr(self, 'aligner_model', None)
+        if train_aligner:
+            args.extend(['--savemodel', model_dir])
+        elif aligner_model:
+            for (filename, content) in aligner_model.items():
+                with open(os.path.join(model_dir, filename), 'wb') as _file:
+                    _file.write(content)
+            args.extend(['--model', model_dir])
+
+        try:
+            proc = subprocess.Popen(args, stdout=subprocess.PIPE)
+            out = proc.communicate()
+            num_sents = int(out[0])
+
+            if train_aligner:
+                self.aligner_model = dict()
+                for filename in os.listdir(model_dir):
+                    with open(os.path.join(model_dir, filename), 'rb') as _file:
+                        self.aligner_model[filename] = _file.read()
+
+            giza_reader = GIZAReader(os.path.join(workdir, 'giza.output'))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
         return giza_reader.aligned_lines[:num_sents]
 
-    def extract_features(self, tagged_sent, alignment, tw_size, target):
+    def extract_features(self, tagged_sent, alignment, tw_size, target, profile=None):
         """Generates the features for the identification given the tagged sentence pair,
         the alignment between them, the window size and a specification of the error
         corresponding to them
 
         Arguments:
             tagged_sent {tuple} -- Tuple from the list generated by the `tag_sentences` method
-            alignment {list} -- List of tuples with the alignment between the setences
+            alignment {Alignment} -- Alignment between the sentences
             tw_size {int} -- Window size for the computation of the features
             target {str} -- Error corresponding to the sentence,
                             if the translation is correct this parameter must be valued to `correct`
 
+        Keyword Arguments:
+            profile {SentenceProfile} -- Profile of `tagged_sent`,
+                                         computed here if not given (default: {None})
+
         Returns:
             dict -- Dictionary with all features to the sentence pair
         """
-        tagged_src = tagged_sent[0]
-        tagged_sys = tagged_sent[1]
+        if profile is None:
+            profile = SentenceProfile(tagged_sent)
+        tagged_src = profile.tagged_src
+        tagged_sys = profile.tagged_sys
 
         lct_src_index = list()
         lct_sys_index = list()
 
         # Apertium deals with MWE
         # Indices where one has MWE
-        has_mw_src = [(i, len(re.findall(r'\w \w', w[0])))
-                      for (i, w) in enumerate(tagged_src) if ' ' in w[0]]
-        has_mw_sys = [(i, len(re.findall(r'\w \w', w[0])))
-                      for (i, w) in enumerate(tagged_sys) if ' ' in w[0]]
+        has_mw_src = profile.has_mw_src
+        has_mw_sys = profile.has_mw_sys
 
         # Get LCT
         if target == 'correct':
-            while not lct_sys_index or None in lct_sys_index:
-                lct_src_index = random.choice(range(len(tagged_src)))
-                # Get sys LCT by alignment
-                lct_sys_index = [a[1]
-                                 for a in alignment if a[0] == lct_src_index]
+            # Source words aligned to MT words. Without any, the sentence is ignored,
+            # since an aligner may leave every word of a pair unaligned
+            aligned = [i for i in range(len(tagged_src))
+                       if alignment.sys_for(i) and None not in alignment.sys_for(i)]
+            if not aligned:
+                return None
+            lct_src_index = random.choice(aligned)
+            # Get sys LCT by alignment
+            lct_sys_index = alignment.sys_for(lct_src_index)
 
             # Correct alignment of tokens in case of MWE
             if has_mw_src:
@@ -262,17 +340,19 @@ class ErrorIdentification(object):
         src_tw_start = max(lct_src_index - (tw_size // 2), 0)
         src_tw_end = min(lct_src_index + (tw_size // 2) + 1, len(tagged_src))
         src_tw = tagged_src[src_tw_start: src_tw_end]
+        src_tw_pos = profile.src_pos[src_tw_start: src_tw_end]
 
         sys_tw_start = max(lct_sys_index - (tw_size // 2), 0)
         sys_tw_end = min(lct_sys_index + (tw_size // 2) + 1, len(tagged_sys))
         sys_tw = tagged_sys[sys_tw_start: sys_tw_end]
+        sys_tw_pos = profile.sys_pos[sys_tw_start: sys_tw_end]
 
         # Compute features
         features = dict()
 
         # Features src
         features['srcSize'] = len(tagged_src)
-        features['engPossessive'] = bool([w for w in tagged_src if 'pos' in w])
+        features['engPossessive'] = profile.eng_possessive
 
         # Features sys
         features['sysSize'] = len(tagged_sys)
@@ -309,12 +389,11 @@ class ErrorIdentification(object):
         # Features sys and src
         for i in range(tw_size):
             try:
-                tok = src_tw[i]
+                tok_tags = src_tw_pos[i]
             except IndexError:
-                tok = list()
+                tok_tags = ''
             finally:
                 key = ''
-                tok_tags = re.sub(r'_\+[^_$]+_', '+', '_'.join(tok[1:]))
                 if i < tw_size // 2:
                     key = 'posToken{}BefSrc'.format(i + 1)
                 elif i == tw_size // 2:
@@ -325,12 +404,11 @@ class ErrorIdentification(object):
 
         for i in range(tw_size):
             try:
-                tok = sys_tw[i]
-            except:
-                tok = list()
+                tok_tags = sys_tw_pos[i]
+            except IndexError:
+                tok_tags = ''
             finally:
                 key = ''
-                tok_tags = re.sub(r'_\+[^_$]+_', '+', '_'.join(tok[1:]))
                 if i < tw_size // 2:
                     key = 'posToken{}BefSys'.format(i + 1)
                 elif i == tw_size // 2:
@@ -340,18 +418,18 @@ class ErrorIdentification(object):
                 features[key] = tok_tags if tok_tags else 'NC'
 
         try:
-            if re.match('vb[^_]+', '_'.join(tagged_src[lct_src_index][1:])):
+            if re.match('vb[^_]+', profile.src_tags[lct_src_index]):
                 features['verbSrc'] = re.sub(
-                    'vb[^_]+_', '', '_'.join(tagged_src[lct_src_index][1:]))
+                    'vb[^_]+_', '', profile.src_tags[lct_src_index])
             else:
                 features['verbSrc'] = 'NC'
         except IndexError:
             features['verbSrc'] = 'NC'
 
         try:
-            if re.match('vb[^_]+', '_'.join(tagged_sys[lct_sys_index][1:])):
+            if re.match('vb[^_]+', profile.sys_tags[lct_sys_index]):
                 features['verbSys'] = re.sub(
-                    'vb[^_]+_', '', '_'.join(tagged_sys[lct_sys_index][1:]))
+                    'vb[^_]+_', '', profile.sys_tags[lct_sys_index])
             else:
                 features['verbSys'] = 'NC'
         except IndexError:
@@ -360,32 +438,10 @@ class ErrorIdentification(object):
         # Features sys/src
         features['srcSysRatio'] = len(tagged_src) / len(tagged_sys)
 
-        num_verbs_src = 0
-        num_nouns_src = 0
-        for tok in tagged_src:
-            try:
-                if re.match('vb[^_]+', '_'.join(tok[1:])):
-                    num_verbs_src += 1
-                elif 'n' in tok[1:]:
-                    num_nouns_src += 1
-            except IndexError:
-                pass
-
-        num_verbs_sys = 0
-        num_nouns_sys = 0
-        for tok in tagged_sys:
-            try:
-                if re.match('vb[^_]+', '_'.join(tok[1:])):
-                    num_verbs_sys += 1
-                elif 'n' in tok[1:]:
-                    num_nouns_sys += 1
-            except IndexError:
-                pass
-
         features['srcSysVRatio'] = max(
-            num_verbs_src, 1) / max(num_verbs_sys, 1)
+            profile.num_verbs_src, 1) / max(profile.num_verbs_sys, 1)
         features['srcSysNRatio'] = max(
-            num_nouns_src, 1) / max(num_nouns_sys, 1)
+            profile.num_nouns_src, 1) / max(profile.num_nouns_sys, 1)
 
         # Remove * from start of lct if exists
         flat_lct_src = re.sub(r'\*', '', tagged_src[lct_src_index][0])
@@ -403,46 +459,34 @@ class ErrorIdentification(object):
 
         return features
 
-    def format_features(self, features):
-        features_names = list(features[0].keys())
-        features_names.remove('target')  # Ignore target for now
+    def format_target(self, features):
+        """Labels of the training instances: `correct` or the error type
 
-        data = pd.DataFrame(features, columns=features_names)
-
-        # Get in DataFrame only numeric and boolean columns
-        # String columns are stored in string_cols
-        string_cols = data.select_dtypes(include='object')
-        data = data.select_dtypes(exclude='object')
-
-        # For each column with string features
-        # Split with '_' and code with get_dummies
-        # Then join to the main DataFrame
-        for col in string_cols:
-            nova_coluna = pd.get_dummies(string_cols[col].str.split('_').apply(
-                pd.Series).stack(), prefix=col, prefix_sep='_').sum(level=0)
-            data = data.join(nova_coluna)
-
-        if features[0]['target'][0] != 'test':
-            # Add target column
-            data = data.join(pd.DataFrame(features, columns=['target']))
-
-            # Get only error label in the target column
-            error_cols = data.loc[data['target'] != 'correct', 'target']
-            error_cols = error_cols.apply(pd.Series)[3]
-            data.loc[data['target'] != 'correct', 'target'] = error_cols
+        Arguments:
+            features {list} -- Feature dictionaries generated by `extract_features`
 
-        return data
+        Returns:
+            np.ndarray -- One label per instance
+        """
+        return np.array([f['target'] if f['target'] == 'correct' else f['target'][3]
+                         for f in features], dtype=object)
 
-    def train_model(self, data, model, step1):
-        X = data.loc[:, data.columns != 'target']
-        y = data['target']
+    def get_encoder(self):
+        """Encoder of the features used in training. Models saved before the encoder
+        was kept only have the names of the training columns, in `features`
+        """
+        encoder = getattr(self, 'encoder', None)
+        if encoder is None:
+            encoder = FeatureEncoder.from_columns(self.features)
+        return encoder
 
+    def train_model(self, X, y, model, step1):
         if step1:
-            y.loc[y != 'correct'] = 'error'
+            y = np.where(y != 'correct', 'error', y)
             y = self.lb_step1.fit_transform(y)
         else:
             X = X[y != 'correct']
-            y = y.loc[y != 'correct']
+            y = y[y != 'correct']
             y = self.lb_step2.fit_transform(y)
 
         classifier = None
@@ -464,6 +508,19 @@ class ErrorIdentification(object):
         return classifier
 
     def classify(self, src_filename, sys_filename):
+        return ''.join(self.iter_classify(src_filename, sys_filename))
+
+    def iter_classify(self, src_filename, sys_filename):
+        """Classifies the sentences of the files, generating the BLAST output
+        as soon as each sentence is classified
+
+        Arguments:
+            src_filename {str} -- Path to the source language file
+            sys_filename {str} -- Path to the Machine Translation output file
+
+        Yields:
+            str -- BLAST header, then the block of each sentence
+        """
         assert self.model_step1
         assert self.model_step2
 
@@ -485,59 +542,104 @@ class ErrorIdentification(object):
         if not self.stop:
             alignments = self.align_sentences(src_filename, sys_filename)
 
-        return_blast = '#Sentencetypes src ref sys\n'
-        return_blast += '#catfile lalic-catsv2\n'
+        yield '#Sentencetypes src ref sys\n#catfile lalic-catsv2\n'
+
+        if self.stop:
+            return
+
+        for (i, error_info) in self.iter_errors(tagged_lines, alignments):
+            yield '{}\n\n{}\n\n{}\n'.format(' '.join(src_lines[i]),
+                                            ' '.join(sys_lines[i]),
+                                            error_info)
+
+    def iter_errors(self, tagged_lines, alignments, batch_size=CLASSIFY_BATCH_SIZE):
+        """Classifies the windows of the sentences in batches of at least `batch_size`
+        windows, with a single prediction of each step per batch
+
+        Arguments:
+            tagged_lines {list} -- Tagged sentence pairs generated by `tag_sentences`
+            alignments {list} -- Aligned lines of the sentence pairs
+
+        Keyword Arguments:
+            batch_size {int} -- Number of windows classified at once (default: {CLASSIFY_BATCH_SIZE})
+
+        Yields:
+            tuple -- Sentence index and its errors in the BLAST format, in sentence order
+        """
+        encoder = self.get_encoder()
+        batch = list()
+        num_windows = 0
 
         for (i, sent) in enumerate(tagged_lines):
             if self.stop:
                 break
 
-            error_info = ''
+            # Sentence values shared by all of its windows
+            profile = SentenceProfile(sent)
+            windows = list()
             for sys_tw, src_tw in self.create_windows(sent[0], sent[1],
-                                                      alignments[i]['alignment']):
+                                                      alignments[i]['alignment'],
+                                                      profile):
                 if self.stop:
                     break
                 features = self.extract_features(sent,
                                                  None, self.tw_size,
-                                                 ('test', (src_tw, sys_tw)))
+                                                 ('test', (src_tw, sys_tw)),
+                                                 profile)
                 if features:
-                    data = self.format_features([features])
-
-                    # Ignore features which were not used in training
-                    extra_features = set(data.columns) - set(self.features)
-                    data = data.drop(extra_features, axis=1)
-
-                    # Include features which were not generated in test
-                    leftout_features = set(self.features) - set(data.columns)
-                    for f in leftout_features:
-                        data[f] = 0
-
-                    data = data[self.features]
-
-                    X = data.loc[:, data.columns != 'target']
-                    X.fillna(value=0, inplace=True)
-                    prediction_step1 = self.model_step1.predict(X)
-                    prediction_step1 = self.lb_step1.inverse_transform(prediction_step1)[0]
-
-                    if prediction_step1 != 'correct':
-                        prediction_step2 = self.model_step2.predict(X)
-                        prediction_step2 = self.lb_step2.inverse_transform(prediction_step2)[0]
-
-                        error_info += str(src_tw) + '#' + str(sys_tw) + '#-1#'
-                        error_info += prediction_step2 + ' '
-            return_blast += ' '.join(src_lines[i])
-            return_blast += '\n\n'
-            return_blast += ' '.join(sys_lines[i])
-            return_blast += '\n\n'
-            return_blast += error_info
-            return_blast += '\n'
-        return return_blast
-
-    def create_windows(self, src_sent, sys_sent, alignment):
-        has_mw_src = [(i, len(re.findall(r'\S (?=\S)', w[0])))
-                      for (i, w) in enumerate(src_sent) if ' ' in w[0]]
-        has_mw_sys = [(i, len(re.findall(r'\S (?=\S)', w[0])))
-                      for (i, w) in enumerate(sys_sent) if ' ' in w[0]]
+                    windows.append((src_tw, sys_tw, features))
+            batch.append((i, windows))
+            num_windows += len(windows)
+
+            if num_windows >= batch_size or i == len(tagged_lines) - 1:
+                if self.stop:
+                    break
+                predictions = iter(self.predict_windows(
+                    [features for (_, windows) in batch for (_, _, features) in windows],
+                    encoder))
+
+                for (line, windows) in batch:
+                    error_info = ''
+                    for (src_tw, sys_tw, _) in windows:
+                        prediction = next(predictions)
+                        if prediction is not None:
+                            error_info += str(src_tw) + '#' + str(sys_tw) + '#-1#'
+                            error_info += prediction + ' '
+                    yield (line, error_info)
+                batch = list()
+                num_windows = 0
+
+    def predict_windows(self, features, encoder):
+        """Runs both steps of the classification over the windows at once.
+        The second step only classifies the windows predicted as errors by the first
+
+        Arguments:
+            features {list} -- Feature dictionaries of the windows
+            encoder {FeatureEncoder} -- Encoder of the training features
+
+        Returns:
+            list -- Error type of each window, or None if it is correct
+        """
+        predictions = [None for _ in features]
+        if not features:
+            return predictions
+
+        X = encoder.transform(features)
+        prediction_step1 = self.lb_step1.inverse_transform(self.model_step1.predict(X))
+
+        error_rows = np.flatnonzero(prediction_step1 != 'correct')
+        if error_rows.size:
+            prediction_step2 = self.model_step2.predict(X[error_rows])
+            prediction_step2 = self.lb_step2.inverse_transform(prediction_step2)
+            for (row, prediction) in zip(error_rows, prediction_step2):
+                predictions[row] = prediction
+        return predictions
+
+    def create_windows(self, src_sent, sys_sent, alignment, profile=None):
+        if profile is None:
+            profile = SentenceProfile((src_sent, sys_sent))
+        has_mw_src = profile.window_mw_src
+        has_mw_sys = profile.window_mw_sys
         for sys_tw_index in range(len(sys_sent)):
 
             if has_mw_sys:
@@ -562,7 +664,7 @@ class ErrorIdentification(object):
             index = sys_tw_index + (pow(-1, i) * ((i + 1) // 2))
             index = max(index, 0)
             index = min(index, sent_len - 1)
-            src_tw_index = [a[0] for a in alignment if a[1] == index]
+            src_tw_index = alignment.src_for(index)
             i += 1
         if not src_tw_index:
             return None
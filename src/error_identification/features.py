@@ -0,0 +1,150 @@
+import re
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+class SentenceProfile(object):
+    """Values of a tagged sentence pair that do not depend on the token window.
+    Computed once per sentence and shared by all of its windows.
+    """
+
+    def __init__(self, tagged_sent):
+        self.tagged_src = tagged_sent[0]
+        self.tagged_sys = tagged_sent[1]
+
+        # Indices of MWE and how many spaces they have,
+        # counted as in `extract_features` and in `create_windows`
+        self.has_mw_src = self.count_mwe(self.tagged_src, r'\w \w')
+        self.has_mw_sys = self.count_mwe(self.tagged_sys, r'\w \w')
+        self.window_mw_src = self.count_mwe(self.tagged_src, r'\S (?=\S)')
+        self.window_mw_sys = self.count_mwe(self.tagged_sys, r'\S (?=\S)')
+
+        # Tags of each token joined with '_'
+        self.src_tags = ['_'.join(tok[1:]) for tok in self.tagged_src]
+        self.sys_tags = ['_'.join(tok[1:]) for tok in self.tagged_sys]
+
+        # POS feature of each token
+        self.src_pos = [re.sub(r'_\+[^_$]+_', '+', tags) for tags in self.src_tags]
+        self.sys_pos = [re.sub(r'_\+[^_$]+_', '+', tags) for tags in self.sys_tags]
+
+        self.eng_possessive = bool([w for w in self.tagged_src if 'pos' in w])
+        self.num_verbs_src, self.num_nouns_src = self.count_verbs_nouns(self.tagged_src,
+                                                                        self.src_tags)
+        self.num_verbs_sys, self.num_nouns_sys = self.count_verbs_nouns(self.tagged_sys,
+                                                                        self.sys_tags)
+
+    @staticmethod
+    def count_mwe(tagged, pattern):
+        return [(i, len(re.findall(pattern, w[0])))
+                for (i, w) in enumerate(tagged) if ' ' in w[0]]
+
+    @staticmethod
+    def count_verbs_nouns(tagged, tags):
+        num_verbs = 0
+        num_nouns = 0
+        for (tok, tok_tags) in zip(tagged, tags):
+            if re.match('vb[^_]+', tok_tags):
+                num_verbs += 1
+            elif 'n' in tok[1:]:
+                num_nouns += 1
+        return num_verbs, num_nouns
+
+
+class FeatureEncoder(object):
+    """Maps the feature dictionaries of `ErrorIdentification.extract_features`
+    to a sparse matrix with a fixed column layout.
+
+    Numeric and boolean features take one column each. String features are split
+    with '_' and each part becomes a `feature_part` column holding its count,
+    as `pd.get_dummies` did. Parts not seen during `fit` are ignored.
+    """
+
+    def __init__(self):
+        self.numeric = list()
+        self.columns = list()
+        self.column_ids = dict()
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Builds the encoder of a model trained with the DataFrame columns in `columns`
+
+        Arguments:
+            columns {list} -- Column names of the training DataFrame
+
+        Returns:
+            FeatureEncoder -- Encoder with the same column layout
+        """
+        encoder = cls()
+        # Feature names have no '_', so only dummy columns have one
+        encoder.numeric = [col for col in columns if col != 'target' and '_' not in col]
+        encoder._set_columns(encoder.numeric +
+                             [col for col in columns if '_' in col])
+        return encoder
+
+    def _set_columns(self, columns):
+        self.columns = columns
+        self.column_ids = {col: i for (i, col) in enumerate(columns)}
+
+    def fit(self, features):
+        """Sets the columns from the training instances
+
+        Arguments:
+            features {list} -- Feature dictionaries
+
+        Returns:
+            FeatureEncoder -- The encoder itself
+        """
+        names = [name for name in features[0].keys() if name != 'target']
+        string_names = set(name for instance in features for name in names
+                           if isinstance(instance.get(name), str))
+        self.numeric = [name for name in names if name not in string_names]
+
+        dummies = list()
+        for name in names:
+            if name in string_names:
+                parts = set(part for instance in features
+                            if isinstance(instance.get(name), str)
+                            for part in instance[name].split('_'))
+                dummies.extend(['{}_{}'.format(name, part) for part in sorted(parts)])
+
+        self._set_columns(self.numeric + dummies)
+        return self
+
+    def transform(self, features):
+        """Encodes the instances with the columns set by `fit`
+
+        Arguments:
+            features {list} -- Feature dictionaries
+
+        Returns:
+            csr_matrix -- One row per instance
+        """
+        data = list()
+        indices = list()
+        indptr = [0]
+        numeric = set(self.numeric)
+        for instance in features:
+            row = dict()
+            for (name, value) in instance.items():
+                if name == 'target' or value is None:
+                    continue
+                if name in numeric:
+                    if not isinstance(value, str):
+                        row[self.column_ids[name]] = float(value)
+                elif isinstance(value, str):
+                    for part in value.split('_'):
+                        col = self.column_ids.get('{}_{}'.format(name, part))
+                        if col is not None:
+                            row[col] = row.get(col, 0) + 1
+            for col in sorted(row):
+                indices.append(col)
+                data.append(row[col])
+            indptr.append(len(indices))
+
+        return csr_matrix((np.array(data, dtype=np.float64),
+                           np.array(indices, dtype=np.int32),
+                           np.array(indptr, dtype=np.int32)),
+                          shape=(len(features), len(self.columns)))
+
+    def fit_transform(self, features):
+        return self.fit(features).transform(features)
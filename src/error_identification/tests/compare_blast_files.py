@@ -1,4 +1,5 @@
 import argparse
+from itertools import zip_longest
 import numpy
 from readers.read_blast import BlastReader
 
@@ -22,38 +23,50 @@ SENT_LIMIT = ARGS.limit
 TIPO_ERROS = ['lex-incTrWord', 'lex-notTrWord']
 
 
-def calcula_medidas():
-    blast_reader_test = BlastReader(BLAST_PATH_TEST)
-    blast_reader_ref = BlastReader(BLAST_PATH_REF)
+def sentencas_pareadas():
+    """Percorre as sentencas dos dois arquivos BLAST ao mesmo tempo,
+    sem carregar os arquivos inteiros na memoria
+
+    Yields:
+        tuple -- Indice da sentenca, sentenca do sistema e erros de teste e referencia
+    """
+    registros = zip_longest(BlastReader.iter_records(BLAST_PATH_TEST),
+                            BlastReader.iter_records(BLAST_PATH_REF))
+    for (sent_idx, (registro_test, registro_ref)) in enumerate(registros):
+        if SENT_LIMIT is not None and sent_idx >= SENT_LIMIT:
+            break
+        sent = registro_test.sys if registro_test else list()
+        erros_test = registro_test.errors if registro_test else list()
+        erros_ref = registro_ref.errors if registro_ref else list()
+        yield sent_idx, sent, erros_test, erros_ref
 
+
+def calcula_medidas():
     verdadeiro_positivo = 0
     falso_positivo = 0
-    for (sent_idx_test, error) in blast_reader_test.error_lines:
-        if SENT_LIMIT is None or (SENT_LIMIT is not None and sent_idx_test < SENT_LIMIT):
+    falso_negativo = 0
+    for (_, _, erros_test, erros_ref) in sentencas_pareadas():
+        for error in erros_test:
             error_type = error[-1]
             sys_idxs = error[1]
 
             fp = 1
-            for (sent_idx_ref, error2) in blast_reader_ref.get_filtered_errors([error_type]):
-                if sent_idx_ref == sent_idx_test:
-                    if set(sys_idxs) & set(error2[1]):
-                        verdadeiro_positivo += 1
-                        fp = 0
-                        break
+            for error2 in erros_ref:
+                if error2[-1] == error_type and set(sys_idxs) & set(error2[1]):
+                    verdadeiro_positivo += 1
+                    fp = 0
+                    break
             falso_positivo += fp
 
-    falso_negativo = 0
-    for (idx, error) in blast_reader_ref.error_lines:
-        if SENT_LIMIT is None or (SENT_LIMIT is not None and sent_idx_test < SENT_LIMIT):
+        for error in erros_ref:
             error_type = error[-1]
             sys_idxs = error[1]
 
             fn = 1
-            for (idx2, error2) in blast_reader_test.get_filtered_errors([error_type]):
-                if idx2 == idx:
-                    if set(sys_idxs) & set(error2[1]):
-                        fn = 0
-                        break
+            for error2 in erros_test:
+                if error2[-1] == error_type and set(sys_idxs) & set(error2[1]):
+                    fn = 0
+                    break
             falso_negativo += fn
 
     precisao = verdadeiro_positivo / (verdadeiro_positivo + falso_positivo)
@@ -64,35 +77,28 @@ def calcula_medidas():
 
 
 def calcula_matriz_confusao():
-    blast_reader_test = BlastReader(BLAST_PATH_TEST)
-    blast_reader_ref = BlastReader(BLAST_PATH_REF)
-
     indices_matriz = {x: TIPO_ERROS.index(x) for x in TIPO_ERROS}
     indices_matriz['correto'] = len(indices_matriz)
 
     matriz = numpy.zeros((len(TIPO_ERROS) + 1, len(TIPO_ERROS) + 1))
 
-    for (sent_idx_test, sent) in enumerate(blast_reader_test.sys_lines):
-        if SENT_LIMIT is None or (SENT_LIMIT is not None and sent_idx_test < SENT_LIMIT):
-            sent_class = blast_reader_test.get_error_messages(sent_idx_test)
-            sent_class_ref = blast_reader_ref.get_error_messages(sent_idx_test)
-
-            for (palavra_idx, palavra) in enumerate(sent):
-                # Classificacao
-                palavra_erros = [x for x in sent_class if palavra_idx in x[1]]
-                if palavra_erros:
-                    idx_linha = indices_matriz[palavra_erros[0][-1]]
-                else:
-                    idx_linha = indices_matriz['correto']
-
-                # Referencia
-                palavra_ref = [x for x in sent_class_ref if palavra_idx in x[1] and x[-1] in TIPO_ERROS]
-                if palavra_ref:
-                    idx_coluna = indices_matriz[palavra_ref[0][-1]]
-                else:
-                    idx_coluna = indices_matriz['correto']
-
-                matriz[idx_linha, idx_coluna] += 1
+    for (_, sent, sent_class, sent_class_ref) in sentencas_pareadas():
+        for (palavra_idx, palavra) in enumerate(sent):
+            # Classificacao
+            palavra_erros = [x for x in sent_class if palavra_idx in x[1]]
+            if palavra_erros:
+                idx_linha = indices_matriz[palavra_erros[0][-1]]
+            else:
+                idx_linha = indices_matriz['correto']
+
+            # Referencia
+            palavra_ref = [x for x in sent_class_ref if palavra_idx in x[1] and x[-1] in TIPO_ERROS]
+            if palavra_ref:
+                idx_coluna = indices_matriz[palavra_ref[0][-1]]
+            else:
+                idx_coluna = indices_matriz['correto']
+
+            matriz[idx_linha, idx_coluna] += 1
     print(indices_matriz)
     matprint(matriz)
 
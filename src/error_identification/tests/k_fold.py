@@ -0,0 +1,224 @@
+import os
+import subprocess
+import sys
+from multiprocessing import Pool
+import numpy as np
+import pandas as pd
+import progressbar
+from sklearn.base import clone
+from sklearn.model_selection import KFold, StratifiedKFold
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.svm import LinearSVC
+from sklearn.linear_model import Perceptron
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.naive_bayes import BernoulliNB
+from readers.read_blast import BlastReader
+from readers.read_giza import GIZAReader
+from utils import extract_features, format_features, tag_sentences
+
+N_SPLITS = 10
+# Seed of the fold splits, so every classifier is evaluated on the same folds
+SPLITS_SEED = 0
+
+
+def classifiers(**forest_params):
+    """Classifiers compared by the k-fold scripts
+
+    Keyword Arguments:
+        forest_params -- Extra parameters of the random forests
+
+    Returns:
+        list -- Tuples with the name and the unfitted classifier
+    """
+    return [('Arvore de decisao - GINI', DecisionTreeClassifier()),
+            ('Arvore de decisao - Entropy', DecisionTreeClassifier(criterion='entropy')),
+            ('SVM - Um contra todos', LinearSVC()),
+            ('SVM - Crammer-Singer', LinearSVC(multi_class='crammer_singer')),
+            ('Perceptron', Perceptron()),
+            ('Random Forest - GINI', RandomForestClassifier(**forest_params)),
+            ('Random Forest - Entropy', RandomForestClassifier(criterion='entropy',
+                                                               **forest_params)),
+            ('Naive Bayes', BernoulliNB())]
+
+
+def build_features(blast_path, errors, tw_size):
+    """Tags and aligns the sentences of a BLAST file and extracts their features
+
+    Arguments:
+        blast_path {str} -- Path to the BLAST file
+        errors {list} -- Error types to keep
+        tw_size {int} -- Size of the token window
+
+    Returns:
+        pd.DataFrame -- One row per instance, with the label in the 'target' column
+    """
+    blast_reader = BlastReader(blast_path)
+    src_lines = list()
+    sys_lines = list()
+    target = list()
+
+    # Correct sentences then error lines
+    for i in blast_reader.get_correct_indices():
+        src_lines.append(blast_reader.src_lines[i])
+        sys_lines.append(blast_reader.sys_lines[i])
+        target.append('correct')
+    for (line, error) in blast_reader.get_filtered_errors(errors):
+        src_lines.append(blast_reader.src_lines[line])
+        sys_lines.append(blast_reader.sys_lines[line])
+        target.append(error)
+
+    # Files for GIZA
+    with open('/tmp/src.txt', 'w') as src_file, open('/tmp/sys.txt', 'w') as sys_file:
+        for (src, sys_line) in zip(src_lines, sys_lines):
+            src_file.write(' '.join(src) + '\n')
+            sys_file.write(' '.join(sys_line) + '\n')
+
+    # Tag sentences
+    print('Tagging sentences', file=sys.stderr)
+    tagged_lines = tag_sentences(src_lines, sys_lines)
+
+    # Align sentences
+    print('Aligning sentences', file=sys.stderr)
+    application_path = str(os.path.abspath(os.path.curdir))
+    proc = subprocess.Popen([application_path + '/src/aligner/align_sentences.sh',
+                             '--srcpath', '/tmp/src.txt',
+                             '--syspath', '/tmp/sys.txt'],
+                            stdout=subprocess.PIPE)
+    out = proc.communicate()
+    num_sents = int(out[0])
+    giza_reader = GIZAReader('/tmp/giza.output')
+    alignments = giza_reader.aligned_lines[:num_sents]
+
+    # Extract features
+    print('Extracting features', file=sys.stderr)
+    training_instances = list()
+    ignored_instances = 0
+    for (i, sent) in progressbar.progressbar(enumerate(tagged_lines)):
+        features = extract_features(
+            sent, alignments[i]['alignment'], tw_size, target[i])
+        if features:
+            training_instances.append(features)
+        else:
+            ignored_instances += 1
+    print('Finalizado!', file=sys.stderr)
+    print('Instancias ignoradas: {}'.format(ignored_instances), file=sys.stderr)
+
+    return format_features(training_instances)
+
+
+def load_features(features_file, blast_path, errors, tw_size):
+    """Loads the features from `features_file`, building and saving them there
+    on the first run, so tagging, alignment and extraction are done only once
+
+    Arguments:
+        features_file {str} -- Path to the pickled DataFrame
+        blast_path {str} -- Path to the BLAST file
+        errors {list} -- Error types to keep
+        tw_size {int} -- Size of the token window
+
+    Returns:
+        pd.DataFrame -- One row per instance, with the label in the 'target' column
+    """
+    if os.path.isfile(features_file):
+        print('Loading features from {}'.format(features_file), file=sys.stderr)
+        return pd.read_pickle(features_file)
+
+    data = build_features(blast_path, errors, tw_size)
+    data.to_pickle(features_file)
+    return data
+
+
+def fold_splits(y, n_splits=N_SPLITS, stratified=False):
+    """Fixed train and test indices of each fold
+
+    Arguments:
+        y {np.ndarray} -- Labels
+
+    Keyword Arguments:
+        n_splits {int} -- Number of folds (default: {N_SPLITS})
+        stratified {bool} -- Keep the class proportions in each fold, as
+            `cross_validate` does, instead of shuffling (default: {False})
+
+    Returns:
+        list -- Tuples with the train and test indices
+    """
+    if stratified:
+        kf = StratifiedKFold(n_splits=n_splits)
+    else:
+        kf = KFold(n_splits=n_splits, shuffle=True, random_state=SPLITS_SEED)
+    return list(kf.split(np.zeros(len(y)), y))
+
+
+# Data of the worker processes, set once by `_init_worker`
+_task_data = dict()
+
+
+def _init_worker(X, y, splits, models, evaluate):
+    _task_data.update(X=X, y=y, splits=splits, models=models, evaluate=evaluate)
+
+
+def _run_task(task):
+    """Fits and evaluates a classifier on one fold
+
+    Arguments:
+        task {tuple} -- Indices of the classifier and of the fold
+
+    Returns:
+        tuple -- Metrics and report returned by the evaluation function
+    """
+    model_idx, fold = task
+    X, y = _task_data['X'], _task_data['y']
+    train, test = _task_data['splits'][fold]
+    model = clone(_task_data['models'][model_idx][1])
+    return _task_data['evaluate'](fold + 1, model, X[train], y[train], X[test], y[test])
+
+
+def run_k_fold(data, evaluate, summarize=None, models=None, n_splits=N_SPLITS,
+               stratified=False, processes=None):
+    """Evaluates each classifier on the same folds, fitting every (classifier, fold)
+    pair in a process pool. The feature matrix is built once and sent to each
+    worker when it starts. Reports are printed in classifier then fold order.
+
+    Arguments:
+        data {pd.DataFrame} -- Features with the label in the 'target' column
+        evaluate {function} -- Called with the fold number, starting at 1, a fresh
+            classifier and the train and test matrices and labels of the fold.
+            Returns a dict of metrics and the report of the fold. It is pickled,
+            so any state it needs, such as a fitted encoder, must be bound to it
+            with `functools.partial` rather than kept in a global
+
+    Keyword Arguments:
+        summarize {function} -- Called with the metrics of all folds of a classifier.
+            Returns its averaged report (default: {None})
+        models {list} -- Tuples with name and classifier (default: {classifiers()})
+        n_splits {int} -- Number of folds (default: {N_SPLITS})
+        stratified {bool} -- Stratified folds, see `fold_splits` (default: {False})
+        processes {int} -- Number of worker processes, all CPUs if None (default: {None})
+
+    Returns:
+        dict -- Metrics of each fold, by classifier name
+    """
+    if models is None:
+        models = classifiers()
+    X = data.loc[:, data.columns != 'target'].values
+    y = data['target'].values
+    splits = fold_splits(y, n_splits, stratified)
+
+    tasks = [(model_idx, fold) for model_idx in range(len(models)) for fold in range(n_splits)]
+    scores = dict()
+    with Pool(processes, initializer=_init_worker,
+              initargs=(X, y, splits, models, evaluate)) as pool:
+        results = pool.imap(_run_task, tasks)
+        for (model_idx, (name, _)) in enumerate(models):
+            if model_idx > 0:
+                print('------------------------------')
+            print(name)
+            scores[name] = list()
+            for fold in range(n_splits):
+                metrics, report = next(results)
+                scores[name].append(metrics)
+                if report:
+                    print(report)
+            if summarize:
+                print(summarize(scores[name]))
+    return scores
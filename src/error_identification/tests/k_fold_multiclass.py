@@ -1,19 +1,8 @@
 #!/usr/bin/env python3
-import subprocess
-import os
-import progressbar
-import sys
+import numpy as np
 from sklearn.preprocessing import LabelEncoder
-from sklearn.model_selection import cross_validate
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.svm import LinearSVC
-from sklearn.linear_model import Perceptron
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.naive_bayes import BernoulliNB
-from sklearn.metrics import classification_report, recall_score, make_scorer
-from readers.read_blast import BlastReader
-from readers.read_giza import GIZAReader
-from utils import extract_features, format_features, tag_sentences
+from sklearn.metrics import accuracy_score, classification_report, f1_score, recall_score
+from k_fold import load_features, run_k_fold
 
 # BLAST_PATH = '/home/marciolima/Documentos/Lalic/post-editing/src/error_identification/error-ident-blast.txt'
 # BLAST_PATH = '/home/marciolima/Documentos/Lalic/post-editing/src/error_identification/exemplo.blast'
@@ -25,193 +14,38 @@ ERRORS = ['lex-incTrWord', 'lex-notTrWord']
 lb = LabelEncoder()
 
 
-def multiclass_recall(y, y_pred, **kwargs):
-    print(classification_report(y, y_pred))
-    return recall_score(y, y_pred, average='weighted')
+def evaluate_multiclass(fold, model, X_train, y_train, X_test, y_test):
+    model.fit(X_train, y_train)
+    results = model.predict(X_test)
 
+    metrics = {'acc': accuracy_score(y_test, results),
+               'rec': recall_score(y_test, results, average='weighted'),
+               'f1': f1_score(y_test, results, average='weighted')}
+    return metrics, classification_report(y_test, results)
 
-def test_multiclass(data):
-    data['target'] = lb.fit_transform(data['target'])
-    print('Classes: {}'.format(list(lb.classes_)))
-
-    X = data.loc[:, data.columns != 'target']
-    y = data['target']
-
-    print('Arvore de decisao - GINI')
-    dt = DecisionTreeClassifier()
-    scores = cross_validate(dt, X, y=y, cv=10, scoring={
-                            'acc': 'accuracy', 'rec': make_scorer(multiclass_recall), 'f1': 'f1_weighted'}, return_train_score=False)
-
-    print('Acurácia: {:.2f} (+/- {:.2f})'.format(
-        scores['test_acc'].mean(), scores['test_acc'].std()))
-    print('Cobertura: {:.2f} (+/- {:.2f})'.format(
-        scores['test_rec'].mean(), scores['test_rec'].std()))
-    print(
-        'F-score: {:.2f} (+/- {:.2f})'.format(scores['test_f1'].mean(), scores['test_f1'].std()))
-    print('------------------------------')
-
-    print('Arvore de decisao - Entropy')
-    dt = DecisionTreeClassifier(criterion='entropy')
-    scores = cross_validate(dt, X, y=y, cv=10, scoring={
-                            'acc': 'accuracy', 'rec': make_scorer(multiclass_recall), 'f1': 'f1_weighted'}, return_train_score=False)
-
-    print('Acurácia: {:.2f} (+/- {:.2f})'.format(
-        scores['test_acc'].mean(), scores['test_acc'].std()))
-    print('Cobertura: {:.2f} (+/- {:.2f})'.format(
-        scores['test_rec'].mean(), scores['test_rec'].std()))
-    print(
-        'F-score: {:.2f} (+/- {:.2f})'.format(scores['test_f1'].mean(), scores['test_f1'].std()))
-    print('------------------------------')
-
-    print('SVM - Um contra todos')
-    dt = LinearSVC()
-    scores = cross_validate(dt, X, y=y, cv=10, scoring={
-                            'acc': 'accuracy', 'rec': make_scorer(multiclass_recall), 'f1': 'f1_weighted'}, return_train_score=False)
-
-    print('Acurácia: {:.2f} (+/- {:.2f})'.format(
-        scores['test_acc'].mean(), scores['test_acc'].std()))
-    print('Cobertura: {:.2f} (+/- {:.2f})'.format(
-        scores['test_rec'].mean(), scores['test_rec'].std()))
-    print(
-        'F-score: {:.2f} (+/- {:.2f})'.format(scores['test_f1'].mean(), scores['test_f1'].std()))
-    print('------------------------------')
-
-    print('SVM - Crammer-Singer')
-    dt = LinearSVC(multi_class='crammer_singer')
-    scores = cross_validate(dt, X, y=y, cv=10, scoring={
-                            'acc': 'accuracy', 'rec': make_scorer(multiclass_recall), 'f1': 'f1_weighted'}, return_train_score=False)
-
-    print('Acurácia: {:.2f} (+/- {:.2f})'.format(
-        scores['test_acc'].mean(), scores['test_acc'].std()))
-    print('Cobertura: {:.2f} (+/- {:.2f})'.format(
-        scores['test_rec'].mean(), scores['test_rec'].std()))
-    print(
-        'F-score: {:.2f} (+/- {:.2f})'.format(scores['test_f1'].mean(), scores['test_f1'].std()))
-    print('------------------------------')
-
-    print('Perceptron')
-    dt = Perceptron()
-    scores = cross_validate(dt, X, y=y, cv=10, scoring={
-                            'acc': 'accuracy', 'rec': make_scorer(multiclass_recall), 'f1': 'f1_weighted'}, return_train_score=False)
-
-    print('Acurácia: {:.2f} (+/- {:.2f})'.format(
-        scores['test_acc'].mean(), scores['test_acc'].std()))
-    print('Cobertura: {:.2f} (+/- {:.2f})'.format(
-        scores['test_rec'].mean(), scores['test_rec'].std()))
-    print(
-        'F-score: {:.2f} (+/- {:.2f})'.format(scores['test_f1'].mean(), scores['test_f1'].std()))
-    print('------------------------------')
 
-    print('Random Forest - GINI')
-    dt = RandomForestClassifier()
-    scores = cross_validate(dt, X, y=y, cv=10, scoring={
-                            'acc': 'accuracy', 'rec': make_scorer(multiclass_recall), 'f1': 'f1_weighted'}, return_train_score=False)
+def summarize_multiclass(scores):
+    def mean_std(name):
+        values = np.array([metrics[name] for metrics in scores])
+        return values.mean(), values.std()
+    return '\n'.join(['Acurácia: {:.2f} (+/- {:.2f})'.format(*mean_std('acc')),
+                      'Cobertura: {:.2f} (+/- {:.2f})'.format(*mean_std('rec')),
+                      'F-score: {:.2f} (+/- {:.2f})'.format(*mean_std('f1'))])
 
-    print('Acurácia: {:.2f} (+/- {:.2f})'.format(
-        scores['test_acc'].mean(), scores['test_acc'].std()))
-    print('Cobertura: {:.2f} (+/- {:.2f})'.format(
-        scores['test_rec'].mean(), scores['test_rec'].std()))
-    print(
-        'F-score: {:.2f} (+/- {:.2f})'.format(scores['test_f1'].mean(), scores['test_f1'].std()))
-    print('------------------------------')
 
-    print('Random Forest - Entropy')
-    dt = RandomForestClassifier(criterion='entropy')
-    scores = cross_validate(dt, X, y=y, cv=10, scoring={
-                            'acc': 'accuracy', 'rec': make_scorer(multiclass_recall), 'f1': 'f1_weighted'}, return_train_score=False)
-
-    print('Acurácia: {:.2f} (+/- {:.2f})'.format(
-        scores['test_acc'].mean(), scores['test_acc'].std()))
-    print('Cobertura: {:.2f} (+/- {:.2f})'.format(
-        scores['test_rec'].mean(), scores['test_rec'].std()))
-    print(
-        'F-score: {:.2f} (+/- {:.2f})'.format(scores['test_f1'].mean(), scores['test_f1'].std()))
-    print('------------------------------')
-
-    print('Naive Bayes')
-    dt = BernoulliNB()
-    scores = cross_validate(dt, X, y=y, cv=10, scoring={
-                            'acc': 'accuracy', 'rec': make_scorer(multiclass_recall), 'f1': 'f1_weighted'}, return_train_score=False)
+def test_multiclass(data):
+    data['target'] = lb.fit_transform(data['target'])
+    print('Classes: {}'.format(list(lb.classes_)))
 
-    print('Acurácia: {:.2f} (+/- {:.2f})'.format(
-        scores['test_acc'].mean(), scores['test_acc'].std()))
-    print('Cobertura: {:.2f} (+/- {:.2f})'.format(
-        scores['test_rec'].mean(), scores['test_rec'].std()))
-    print(
-        'F-score: {:.2f} (+/- {:.2f})'.format(scores['test_f1'].mean(), scores['test_f1'].std()))
+    # Stratified folds, as `cross_validate` used
+    run_k_fold(data, evaluate_multiclass, summarize_multiclass, stratified=True)
 
 
 def main():
     """Main function
     """
-    blast_reader = BlastReader(BLAST_PATH)
-    src_lines = list()
-    sys_lines = list()
-    target = list()
-
-    # Files for GIZA
-    src_file = open('/tmp/src.txt', 'w')
-    sys_file = open('/tmp/sys.txt', 'w')
-
-    # Correct sentences
-    for i in blast_reader.get_correct_indices():
-        src_lines.append(blast_reader.src_lines[i])
-        sys_lines.append(blast_reader.sys_lines[i])
-        target.append('correct')
-
-        # Write files for GIZA
-        src_file.write(' '.join(blast_reader.src_lines[i]))
-        src_file.write('\n')
-        sys_file.write(' '.join(blast_reader.sys_lines[i]))
-        sys_file.write('\n')
-
-    # Error lines
-    errors = blast_reader.get_filtered_errors(ERRORS)
-    # errors = blast_reader.error_lines
-    for (line, error) in errors:
-        src_lines.append(blast_reader.src_lines[line])
-        sys_lines.append(blast_reader.sys_lines[line])
-        target.append(error)
-
-        src_file.write(' '.join(blast_reader.src_lines[line]))
-        src_file.write('\n')
-        sys_file.write(' '.join(blast_reader.sys_lines[line]))
-        sys_file.write('\n')
-    src_file.close()
-    sys_file.close()
-
-    # Tag sentences
-    print('Tagging sentences', file=sys.stderr)
-    tagged_lines = tag_sentences(src_lines, sys_lines)
-
-    # Align sentences
-    print('Aligning sentences', file=sys.stderr)
-    application_path = str(os.path.abspath(os.path.curdir))
-    proc = subprocess.Popen([application_path + '/src/aligner/align_sentences.sh',
-                             '--srcpath', '/tmp/src.txt',
-                             '--syspath', '/tmp/sys.txt'],
-                            stdout=subprocess.PIPE)
-    out = proc.communicate()
-    num_sents = int(out[0])
-    giza_reader = GIZAReader('/tmp/giza.output')
-    alignments = giza_reader.aligned_lines[:num_sents]
-
-    # Extract features
-    print('Extracting features', file=sys.stderr)
-    training_instances = list()
-    ignored_instances = 0
-    for (i, sent) in progressbar.progressbar(enumerate(tagged_lines)):
-        features = extract_features(
-            sent, alignments[i]['alignment'], TW_SZ, target[i])
-        if features:
-            training_instances.append(features)
-        else:
-            ignored_instances += 1
-    print('Finalizado!', file=sys.stderr)
-    print('Instancias ignoradas: {}'.format(ignored_instances), file=sys.stderr)
-
-    print('Iniciando treinamento', file=sys.stderr)
-    data = format_features(training_instances)
+    data = load_features(FEATURES_FILE, BLAST_PATH, ERRORS, TW_SZ)
+    print('Iniciando treinamento')
     test_multiclass(data)
 
 
@@ -1,10 +1,10 @@
 import pandas as pd
-import os
 import re
 import progressbar
-import subprocess
 import random
 import string
+from apertium.apertium_tagger import TaggerPool
+from apertium.tagger_cache import TaggerCache
 
 def tag_sentences(src, sys):
     """Tags all sentences from src and sys
@@ -16,8 +16,9 @@ def tag_sentences(src, sys):
     Returns:
         list -- List of tuples with aligned tagged lines. Tags are in a list
     """
-    src_out = run_apertium_tagger(src, 'en')
-    sys_out = run_apertium_tagger(sys, 'pt')
+    with TaggerPool() as tagger_pool, TaggerCache() as tagger_cache:
+        src_out = run_apertium_tagger(src, 'en', tagger_pool, tagger_cache)
+        sys_out = run_apertium_tagger(sys, 'pt', tagger_pool, tagger_cache)
 
     assert len(src_out) == len(sys_out)
     num_sents = len(src_out)
@@ -40,26 +41,22 @@ def tag_sentences(src, sys):
     return list(zip(src_tags, sys_tags))
 
 
-def run_apertium_tagger(lines, lang):
-    """Creates a subprocess to run the Apertium Tagger via the `apertium/parse_file.sh` script
+def run_apertium_tagger(lines, lang, tagger_pool, tagger_cache):
+    """Tags the lines with the long-lived Apertium taggers of `tagger_pool`,
+    which produce the same output as the `apertium/parse_file.sh` script.
+    Lines already in `tagger_cache` are not tagged again
 
     Arguments:
         lines {list} -- List of lines to be tagged
         lang {str} -- Language to run the tagger with
+        tagger_pool {TaggerPool} -- Worker processes running the taggers
+        tagger_cache {TaggerCache} -- Cache of previously tagged lines
 
     Returns:
         list -- Returns a list with all tagged lines in the Apertium format
     """
-    application_path = str(os.path.abspath(os.path.curdir))
-    out_lines = list()
-
-    for line in progressbar.progressbar(lines):
-        proc = subprocess.Popen([application_path + '/src/apertium/parse_file.sh', '--lang', lang],
-                                stdin=subprocess.PIPE, universal_newlines=True,
-                                stdout=subprocess.PIPE)
-        out = proc.communicate(' '.join(line))
-        out_lines.append(out[0])
-    return out_lines
+    return list(progressbar.progressbar(tagger_cache.imap(lines, lang, tagger_pool),
+                                        max_value=len(lines)))
 
 
 def extract_features(tagged_sent, alignment, tw_size, target):
@@ -69,7 +66,7 @@ def extract_features(tagged_sent, alignment, tw_size, target):
 
     Arguments:
         tagged_sent {tuple} -- Tuple from the list generated by the `tag_sentences` method
-        alignment {list} -- List of tuples with the alignment between the setences
+        alignment {Alignment} -- Alignment between the sentences
         tw_size {int} -- Window size for the computation of the features
         target {str} -- Error corresponding to the sentence,
                         if the translation is correct this parameter must be valued to `correct`
@@ -95,7 +92,7 @@ def extract_features(tagged_sent, alignment, tw_size, target):
         while not lct_sys_index or None in lct_sys_index:
             lct_src_index = random.choice(range(len(tagged_src)))
             # Get sys LCT by alignment
-            lct_sys_index = [a[1] for a in alignment if a[0] == lct_src_index]
+            lct_sys_index = alignment.sys_for(lct_src_index)
 
         # Correct alignment of tokens in case of MWE
         if has_mw_src:
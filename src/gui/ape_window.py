@@ -6,10 +6,48 @@ import tkinter.messagebox as msgb
 import os
 import queue
 import threading
+import numpy as np
 from readers.read_blast import BlastReader
 from readers.read_muse_embeds import MuseReader, load_embeddings, closest_words
+from embeddings.index import EmbeddingIndex
+from embeddings.ivf import IVFIndex
+from embeddings.csls import has_penalties, load_penalties
+from embeddings.neighbours import NeighbourTable, has_table
+from embeddings.tiers import TieredIndex
 from post_edit import PostEditor
 
+# Inverted lists searched for each suggestion, for an approximate search with
+# `embeddings.ivf.IVFIndex`. None searches the whole Portuguese vocabulary
+SUGGESTIONS_NPROBE = None
+# Options of the Portuguese index, see `embeddings.index.EmbeddingIndex`.
+# Vectors are scored in float32 by default. {'dtype': np.int8, 'rerank': True}
+# takes a quarter of the memory, re-ranking the best candidates with the
+# memory-mapped float32 vectors
+SUGGESTIONS_INDEX_OPTIONS = {'dtype': np.float32}
+# Rank suggestions by CSLS when the penalties were precomputed with
+# src/embeddings/csls.py, by cosine otherwise
+SUGGESTIONS_CSLS = True
+# Tiers of most frequent Portuguese words searched first, as in
+# `embeddings.tiers.TIERS`. When set, they replace the inverted lists
+SUGGESTIONS_TIERS = None
+
+
+def index_options(en_path, pt_path):
+    '''Options of the index over the Portuguese embeddings'''
+    options = dict(SUGGESTIONS_INDEX_OPTIONS)
+    if SUGGESTIONS_CSLS and has_penalties(pt_path, en_path):
+        options['penalties'] = load_penalties(pt_path)
+    return options
+
+
+def neighbour_table(en_path, pt_path, pt_words):
+    '''Suggestions precomputed with src/embeddings/neighbours.py, None if there are none
+    or if they do not rank words as the search does'''
+    csls = SUGGESTIONS_CSLS and has_penalties(pt_path, en_path)
+    if not has_table(en_path, pt_path, csls):
+        return None
+    return NeighbourTable.load(en_path, pt_words)
+
 
 class PostEditWindow(object):
     '''
@@ -86,6 +124,8 @@ class PostEditWindow(object):
 
         # Threads
         self.ape_queue = queue.Queue()
+        # Number of words answered by each tier of a tiered search, set by `PostEditor`
+        self.suggestions_report = None
         self.muse_en_queue = queue.Queue()
         self.muse_pt_queue = queue.Queue()
         self.running_threads = list()
@@ -221,9 +261,20 @@ class PostEditWindow(object):
                 self.progress_bar.grid(row=4, column=0, columnspan=3, pady=10)
 
                 # Post Editing Thread
+                en_path = self.en_path_text.get('1.0', tk.END).strip()
+                pt_path = self.pt_path_text.get('1.0', tk.END).strip()
                 self.running_threads.append(PostEditor(self,
                                                        blast_reader,
-                                                       progress_var))
+                                                       progress_var,
+                                                       processes=True,
+                                                       ann_path=pt_path if SUGGESTIONS_NPROBE
+                                                       else None,
+                                                       nprobe=SUGGESTIONS_NPROBE,
+                                                       index_options=index_options(en_path,
+                                                                                   pt_path),
+                                                       table=neighbour_table(en_path, pt_path,
+                                                                             self.emb_pt.words),
+                                                       tiers=SUGGESTIONS_TIERS))
                 self.blast_window.after(100, self.ape_queue_callback)
 
     def load_muse_callback(self):
@@ -250,7 +301,10 @@ class PostEditWindow(object):
         try:
             msg = self.ape_queue.get_nowait()
             if msg == 0:
-                msgb.showinfo(_('Saved'), _('File saved as: ') + self.filename)
+                message = _('File saved as: ') + self.filename
+                if self.suggestions_report:
+                    message += '\n\n' + self.suggestions_report
+                msgb.showinfo(_('Saved'), message)
                 self.close_window_callback()
             else:
                 if not self.should_close:
@@ -405,38 +459,54 @@ class CorrectSentencesWindow(object):
             self.pt_path_button.config(state=tk.DISABLED)
 
     def correct_sentences(self, blast_filename, en_filename, pt_filename):
-        blast_reader = BlastReader(blast_filename)
         en, pt = load_embeddings(en_filename, pt_filename)
+        table = neighbour_table(en_filename, pt_filename, pt.words)
+        if SUGGESTIONS_TIERS:
+            pt = TieredIndex(pt, SUGGESTIONS_TIERS, **index_options(en_filename, pt_filename))
+        elif SUGGESTIONS_NPROBE:
+            pt = IVFIndex.cached(pt, pt_filename, nprobe=SUGGESTIONS_NPROBE,
+                                 **index_options(en_filename, pt_filename))
+        else:
+            pt = EmbeddingIndex(pt, **index_options(en_filename, pt_filename))
+
+        # Each sentence block has 5 lines, after the 2 header lines
+        with open(blast_filename, 'r') as _file:
+            num_sents = (sum(1 for _ in _file) - 2) // 5
 
         self.progress_bar.grid(row=4, column=0, columnspan=3, padx=(20, 0))
-        self.progress_bar['maximum'] = len(blast_reader.sys_lines)
+        self.progress_bar['maximum'] = num_sents
         self.progress_var.set(0)
         self.cancel_button.config(state=tk.ACTIVE)
 
-        file_content = ''
-        for i, sent in enumerate(blast_reader.sys_lines):
-            self.progress_var.set(i)
-
-            if self.stop:
-                break
-
-            errors = blast_reader.get_error_messages(i)
-            errors = [e for e in errors if e[-1] in self.app.errors]
-            if errors:
-                for error in errors:
-                    if self.stop:
-                        break
-
-                    words_to_ignore = list()
-                    if error[0][0] >= 0:
-                        for index in error[1]:
-                            words_to_ignore.append(sent[index])
-                            del sent[index]
-                        suggestions = closest_words(blast_reader.src_lines[i][error[0][0]],
-                                                    en, pt, words_to_ignore)
-                        sent.insert(error[1][0], suggestions[0][0])
-            file_content += ' '.join(sent)
-            file_content += '\n'
+        # Sentences are read and written one at a time.
+        # The output is only moved to its final name if the correction is not cancelled
+        save_filaname = os.path.splitext(blast_filename)[
+            0] + '-corrected.txt'
+        with open(save_filaname + '.tmp', 'w') as save_file:
+            for record in BlastReader.iter_records(blast_filename):
+                i = record.line
+                sent = record.sys
+                self.progress_var.set(i)
+
+                if self.stop:
+                    break
+
+                errors = [e for e in record.errors if e[-1] in self.app.errors]
+                if errors:
+                    for error in errors:
+                        if self.stop:
+                            break
+
+                        words_to_ignore = list()
+                        if error[0][0] >= 0:
+                            for index in error[1]:
+                                words_to_ignore.append(sent[index])
+                                del sent[index]
+                            suggestions = closest_words(record.src[error[0][0]],
+                                                        en, pt, words_to_ignore, table)
+                            sent.insert(error[1][0], suggestions[0][0])
+                save_file.write(' '.join(sent))
+                save_file.write('\n')
         self.progress_bar.stop()
         self.progress_bar.grid_forget()
         self.done_button.config(state=tk.ACTIVE)
@@ -446,9 +516,10 @@ class CorrectSentencesWindow(object):
         self.can_close = True
 
         if not self.stop:
-            save_filaname = os.path.splitext(blast_filename)[
-                0] + '-corrected.txt'
-            with open(save_filaname, 'w') as _file:
-                _file.write(file_content)
-
-            msgb.showinfo(_('Saved'), _('File saved as: ') + save_filaname)
+            os.replace(save_filaname + '.tmp', save_filaname)
+            message = _('File saved as: ') + save_filaname
+            if SUGGESTIONS_TIERS:
+                message += '\n\n' + pt.report()
+            msgb.showinfo(_('Saved'), message)
+        else:
+            os.remove(save_filaname + '.tmp')
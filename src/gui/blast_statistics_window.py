@@ -76,23 +76,25 @@ class BLASTStatsWindow(object):
 
     def get_statistics(self):
         '''Read BLAST file and get statistics for each error type'''
+        error_occurences = {_type: 0 for _type in self.error_types}
         try:
-            blast_reader = BlastReader(self.blast_file_path.name)
+            # Single pass over the file, one sentence at a time
+            for record in BlastReader.iter_records(self.blast_file_path.name):
+                for error in record.errors:
+                    if error[-1] in error_occurences:
+                        error_occurences[error[-1]] += 1
         except FileNotFoundError:
             tk.messagebox.showerror(
                 _('File not found'), _('BLAST file not found.'))
         except AttributeError:
             pass
         else:
-            total_errors = len(
-                blast_reader.get_filtered_errors(self.error_types.keys()))
+            total_errors = sum(error_occurences.values())
 
             for _type in self.error_types:
-                error_occurences = len(
-                    blast_reader.get_filtered_errors([_type]))
-                error_percentage = (error_occurences / total_errors) * 100
+                error_percentage = (error_occurences[_type] / total_errors) * 100
                 self.error_stats_values[_type] = (
-                    error_occurences, '{0:.2f}'.format(error_percentage))
+                    error_occurences[_type], '{0:.2f}'.format(error_percentage))
 
     def insert_table_values(self):
         '''Inserts values in the table'''
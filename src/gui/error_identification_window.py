@@ -36,26 +36,51 @@ class TrainModelWindow(object):
         self.blast_path_button.message = 'BLAST'
         self.blast_path_button.grid(row=0, column=2)
 
+        # Optional MUSE files, to align the sentences with the embeddings instead of MGIZA
+        self.muse_en_path_label = tk.Label(
+            self.train_model_widget, text=_('English embeddings (optional)'))
+        self.muse_en_path_label.grid(row=1, column=0, sticky=tk.W)
+        self.muse_en_path_text = tk.Text(self.train_model_widget, height=1)
+        self.muse_en_path_text.config(state=tk.DISABLED)
+        self.muse_en_path_text.grid(row=1, column=1, padx=10)
+        self.muse_en_path_button = tk.Button(
+            self.train_model_widget, text=_('Select'))
+        self.muse_en_path_button.bind('<Button-1>', self.get_filename_callback)
+        self.muse_en_path_button.message = 'MUSE en'
+        self.muse_en_path_button.grid(row=1, column=2)
+
+        self.muse_pt_path_label = tk.Label(
+            self.train_model_widget, text=_('Portuguese embeddings (optional)'))
+        self.muse_pt_path_label.grid(row=2, column=0, sticky=tk.W)
+        self.muse_pt_path_text = tk.Text(self.train_model_widget, height=1)
+        self.muse_pt_path_text.config(state=tk.DISABLED)
+        self.muse_pt_path_text.grid(row=2, column=1, padx=10)
+        self.muse_pt_path_button = tk.Button(
+            self.train_model_widget, text=_('Select'))
+        self.muse_pt_path_button.bind('<Button-1>', self.get_filename_callback)
+        self.muse_pt_path_button.message = 'MUSE pt'
+        self.muse_pt_path_button.grid(row=2, column=2)
+
         # Model selection
         self.model_type = tk.StringVar(self.train_model_widget)
         self.model_type.set(MODELS[0])
         self.model_label = tk.Label(
             self.train_model_widget, text=_('Model type'))
-        self.model_label.grid(row=2, column=0, pady=10)
+        self.model_label.grid(row=3, column=0, pady=10)
         self.model_menu = tk.OptionMenu(
             self.train_model_widget, self.model_type, *MODELS)
-        self.model_menu.grid(row=2, column=1, columnspan=2,
+        self.model_menu.grid(row=3, column=1, columnspan=2,
                              pady=10, sticky=tk.W)
 
         # Done
         self.done_button = tk.Button(
             self.train_model_widget, text=_('Done'), command=self.run_train_model)
-        self.done_button.grid(row=3, column=0, columnspan=2, pady=10)
+        self.done_button.grid(row=4, column=0, columnspan=2, pady=10)
 
         # Cancel
         self.cancel_button = tk.Button(
             self.train_model_widget, text=_('Cancel'), command=self.cancel_train_model)
-        self.cancel_button.grid(row=3, column=1, columnspan=3, pady=10)
+        self.cancel_button.grid(row=4, column=1, columnspan=3, pady=10)
 
         # Progress bar
         self.progress_bar = ttk.Progressbar(
@@ -76,19 +101,39 @@ class TrainModelWindow(object):
                 self.blast_path_text.delete('1.0', tk.END)
                 self.blast_path_text.insert('end', filename.name)
                 self.blast_path_text.config(state=tk.DISABLED)
+            elif event.widget.message == 'MUSE en':
+                self.filenames['muse_en'] = filename.name
+                self.muse_en_path_text.config(state=tk.NORMAL)
+                self.muse_en_path_text.delete('1.0', tk.END)
+                self.muse_en_path_text.insert('end', filename.name)
+                self.muse_en_path_text.config(state=tk.DISABLED)
+            elif event.widget.message == 'MUSE pt':
+                self.filenames['muse_pt'] = filename.name
+                self.muse_pt_path_text.config(state=tk.NORMAL)
+                self.muse_pt_path_text.delete('1.0', tk.END)
+                self.muse_pt_path_text.insert('end', filename.name)
+                self.muse_pt_path_text.config(state=tk.DISABLED)
 
     def run_train_model(self):
         """Starts the training for the model.
         Creates a new ErrorIdentification object then starts a thread for the training.
-        Also displays the progressbar.
+        Also displays the progressbar. When both MUSE files are selected, the model
+        aligns sentences with the embeddings instead of MGIZA.
         """
+        muse_paths = [self.filenames.get('muse_en'), self.filenames.get('muse_pt')]
+        if any(muse_paths) and not all(muse_paths):
+            tk.messagebox.showerror(_('Select files'),
+                                    _('Select both MUSE files to align with the embeddings.'))
+            return
+
         # Start training thread
-        self.error_ident = ErrorIdentification()
+        self.error_ident = ErrorIdentification(
+            embeddings_paths=tuple(muse_paths) if all(muse_paths) else None)
         train_thread = threading.Thread(target=self.train_model)
         train_thread.start()
 
         # Show progressbar and start update callback
-        self.progress_bar.grid(row=4, column=0, columnspan=2, pady=10)
+        self.progress_bar.grid(row=5, column=0, columnspan=2, pady=10)
         self.progress_bar.start(50)
         self.progress_bar.after(5, self.update_progress_bar_callback)
 
@@ -251,7 +296,7 @@ class TestModelWindow(object):
     def test_model(self):
         """Performs the test of the model in a separate
         thread created by `self.run_test_model`. Also saves the classification
-        in a BLAST file.
+        in a BLAST file, while it is generated.
         """
         try:
             assert self.filenames['src']
@@ -261,13 +306,19 @@ class TestModelWindow(object):
             tk.messagebox.showerror(_('Select files'), _('It is necessary to select all files.'))
         else:
             save_filename = self.filenames['sys'] + '-blast'
-            _class = self.error_ident.classify(self.filenames['src'],
-                                               self.filenames['sys'])
 
+            # Each sentence is written as soon as it is classified,
+            # so a cancelled test keeps the sentences already classified
+            with open(save_filename, 'w') as _file:
+                for block in self.error_ident.iter_classify(self.filenames['src'],
+                                                            self.filenames['sys']):
+                    _file.write(block)
+                    _file.flush()
             if not self.error_ident.stop:
-                with open(save_filename, 'w') as _file:
-                    _file.write(_class)
-                    tk.messagebox.showinfo(_('Saved'), _('File saved as: ') + save_filename)
+                tk.messagebox.showinfo(_('Saved'), _('File saved as: ') + save_filename)
+            else:
+                tk.messagebox.showinfo(_('Cancelled'),
+                                       _('Partial classification saved as: ') + save_filename)
             self.error_ident.stop = True
 
     def cancel_test_model(self):
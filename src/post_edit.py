@@ -1,24 +1,60 @@
+import os
+import shutil
+import tempfile
 import threading
 import queue
+import multiprocessing
 from multiprocessing import cpu_count
-from readers.read_muse_embeds import closest_words
+from readers.read_muse_embeds import closest_words_batch, filter_candidates
+from embeddings.index import EmbeddingIndex
+from embeddings.ivf import IVFIndex, NPROBE
+from embeddings.tiers import TieredIndex
+from embeddings.neighbours import NEIGHBOURS_K
 
 
 class PostEditor(threading.Thread):
+    """Generates the suggestions for every error of the selected type in a BLAST file.
 
-    def __init__(self, window, blast_reader, progress_var):
+    The errors are split into chunks, each handled by a `PostEditChunk` thread or,
+    when `processes` is set, by a `post_edit_chunk` process. Worker processes
+    memory-map the Portuguese index from a temporary file instead of receiving
+    a copy of the embeddings.
+
+    With `ann_path`, suggestions come from an `IVFIndex` whose inverted lists are
+    saved next to the Portuguese embeddings file at that path, searching `nprobe`
+    lists per word, instead of from an exhaustive search. `index_options` are
+    passed to the index, e.g. a quantized `dtype` and `rerank`. Words of the
+    `NeighbourTable` given as `table` are looked up instead of searched.
+    With `tiers`, a `TieredIndex` is used instead. The number of words answered
+    by each tier, summed over all workers, is kept in `window.suggestions_report`
+    before the end of the run is signalled.
+    """
+
+    def __init__(self, window, blast_reader, progress_var, processes=False,
+                 ann_path=None, nprobe=NPROBE, index_options=None, table=None,
+                 tiers=None):
         threading.Thread.__init__(self)
         self.window = window
         self.blast_reader = blast_reader
         self.emb_en = window.emb_en
         self.emb_pt = window.emb_pt
         self.progress_var = progress_var
+        self.processes = processes
+        self.ann_path = ann_path
+        self.nprobe = nprobe
+        self.index_options = index_options or dict()
+        self.table = table
+        self.tiers = tiers
 
         self.chunk_threads = list()
 
         self.msg_queue = window.ape_queue
-        self.queue_threads_in = queue.Queue()
-        self.queue_threads_out = queue.Queue()
+        if processes:
+            self.queue_threads_in = multiprocessing.Queue()
+            self.queue_threads_out = multiprocessing.Queue()
+        else:
+            self.queue_threads_in = queue.Queue()
+            self.queue_threads_out = queue.Queue()
 
         self.start()
 
@@ -26,41 +62,107 @@ class PostEditor(threading.Thread):
         errors = self.blast_reader.get_filtered_errors(
             [self.window.error_type.get()])
 
+        if self.tiers:
+            index_pt = TieredIndex(self.emb_pt, self.tiers, **self.index_options)
+        elif self.ann_path:
+            index_pt = IVFIndex.cached(self.emb_pt, self.ann_path, nprobe=self.nprobe,
+                                       **self.index_options)
+        else:
+            index_pt = EmbeddingIndex(self.emb_pt, **self.index_options)
+        max_ignored = max([len(error[1]) for (_, error) in errors], default=0)
+
         save_file_content = ''
         save_file_content += '@annotations\n-1\n'
         error_num = 0
 
-        num_threads = cpu_count() - 1
+        num_threads = max(cpu_count() - 1, 1)
         chunk_size = len(errors) // num_threads
         chunks = [list(enumerate(errors))[t * chunk_size:] if t == num_threads - 1 else
                   list(enumerate(errors))[t * chunk_size:(t+1) * chunk_size]
                   for t in range(num_threads)]
 
-        for chunk in chunks:
-            self.chunk_threads.append(PostEditChunk(self.blast_reader,
-                                                    self.emb_en, self.emb_pt, chunk,
-                                                    self.queue_threads_in, self.queue_threads_out))
+        index_dir = None
+        if self.processes:
+            index_dir = tempfile.mkdtemp()
+            index_path = os.path.join(index_dir, 'pt')
+            index_pt.save(index_path)
+
+            for chunk in chunks:
+                # Send each process only the lines and vectors its chunk needs
+                lines = {line: (self.blast_reader.src_lines[line],
+                                self.blast_reader.ref_lines[line],
+                                self.blast_reader.sys_lines[line])
+                         for (_, (line, _)) in chunk}
+                src_words = set(lines[line][0][i]
+                                for (_, (line, error)) in chunk for i in error[0] if i > -1)
+                # Words of the table are looked up here, the rest is searched by the process.
+                # So are the words of the table with too few candidates for some error
+                known = dict()
+                if self.table is not None:
+                    known = self.table.suggestions(src_words)
+                    short = self.table.short_words(error_queries(
+                        self.blast_reader.src_lines, self.blast_reader.sys_lines,
+                        [error for (_, error) in chunk]))
+                    src_words = (src_words - set(known)) | short
+                vectors = {w: self.emb_en[w] for w in src_words if w in self.emb_en}
+
+                process = multiprocessing.Process(target=post_edit_chunk,
+                                                  args=(index_path, lines, src_words,
+                                                        vectors, max_ignored, chunk,
+                                                        self.queue_threads_in,
+                                                        self.queue_threads_out,
+                                                        getattr(index_pt, 'nprobe', None),
+                                                        known, self.tiers))
+                process.start()
+                self.chunk_threads.append(process)
+        else:
+            # Suggestions for every source word are computed at once and
+            # shared by all chunks, which then only remove the ignored words
+            src_words = [self.blast_reader.src_lines[line][i]
+                         for (line, error) in errors for i in error[0] if i > -1]
+            suggestions = closest_words_batch(src_words, self.emb_en, index_pt,
+                                              extra=max_ignored, table=self.table)
+            # Words of the table with too few candidates for some error are also searched
+            fallback = dict()
+            if self.table is not None:
+                short = self.table.short_words(error_queries(
+                    self.blast_reader.src_lines, self.blast_reader.sys_lines, errors))
+                fallback = closest_words_batch(short, self.emb_en, index_pt, extra=max_ignored)
+
+            for chunk in chunks:
+                self.chunk_threads.append(PostEditChunk(self.blast_reader,
+                                                        suggestions, chunk,
+                                                        self.queue_threads_in,
+                                                        self.queue_threads_out,
+                                                        fallback))
 
+        # Workers always finish by sending 0, even when cancelled.
+        # Reading until then keeps worker processes from blocking on a full pipe
         content_list = ['' for _ in range(len(errors))]
         finished_threads = 0
-        while True:
-            if self.window.stop:
+        cancelled = False
+        while finished_threads < num_threads:
+            if self.window.stop and not cancelled:
                 for _ in range(num_threads):
                     self.queue_threads_in.put(-1)
-                for thread in self.chunk_threads:
-                    thread.join()
-                break
+                cancelled = True
             msg = self.queue_threads_out.get()
             if msg == 0:
                 finished_threads += 1
-            else:
+            elif msg[0] == 'tiers':
+                index_pt.add_counts(msg[1])
+            elif not cancelled:
                 content_list[msg[0]] = msg[1]
                 self.progress_var.set(error_num)
                 error_num += 1
-            if finished_threads == num_threads:
-                break
+        for thread in self.chunk_threads:
+            thread.join()
+
+        if index_dir:
+            shutil.rmtree(index_dir, ignore_errors=True)
 
         save_file_content += ''.join(content_list)
+        self.window.suggestions_report = index_pt.report() if self.tiers else None
 
         if not self.window.stop:
             save_file = open(self.window.filename, 'w')
@@ -73,11 +175,11 @@ class PostEditor(threading.Thread):
 
 class PostEditChunk(threading.Thread):
 
-    def __init__(self, blast_reader, emb_en, emb_pt, chunk, queue_in, queue_out):
+    def __init__(self, blast_reader, suggestions, chunk, queue_in, queue_out, fallback=None):
         threading.Thread.__init__(self)
         self.blast_reader = blast_reader
-        self.emb_en = emb_en
-        self.emb_pt = emb_pt
+        self.suggestions = suggestions
+        self.fallback = fallback
         self.chunk = chunk
         self.queue_in = queue_in
         self.queue_out = queue_out
@@ -85,38 +187,117 @@ class PostEditChunk(threading.Thread):
         self.start()
 
     def run(self):
-        for (error_index, error) in self.chunk:
-            try:
-                msg = self.queue_in.get_nowait()
-                if msg == -1:
-                    break
-            except queue.Empty:
-                line = error[0]
-                write_line = ''
-                write_line += ' '.join(self.blast_reader.src_lines[line])
-                write_line += '\n'
-                write_line += ' '.join(self.blast_reader.ref_lines[line])
-                write_line += '\n'
-                write_line += ' '.join(self.blast_reader.sys_lines[line])
-                write_line += '\n'
-
-                error_info = [','.join(map(str, e)) for e in error[1][:-1]]
-                error_info.append(error[1][-1])
-                write_line += '#'.join(error_info)
-                write_line += '\n'
-
-                sentence_to_correct = self.blast_reader.src_lines[line]
-                sys_sentence = self.blast_reader.sys_lines[line]
-                candidates = list()
-                for i in error[1][0]:
-                    if i > -1:
-                        candidates.extend(['-.-'.join([w[0], 'white']) for w in closest_words(
-                            sentence_to_correct[i], self.emb_en, self.emb_pt,
-                            words_to_ignore=[sys_sentence[j] for j in error[1][1]])])
-                    else:
-                        candidates.append('-.-'.join(['***', 'white']))
-                write_line += '#@'.join(candidates)
-                write_line += '\n'
-
-                self.queue_out.put((error_index, write_line))
-        self.queue_out.put(0)
+        edit_chunk(self.blast_reader.src_lines,
+                   self.blast_reader.ref_lines,
+                   self.blast_reader.sys_lines,
+                   self.suggestions, self.chunk, self.queue_in, self.queue_out,
+                   self.fallback)
+
+
+def post_edit_chunk(index_path, lines, src_words, vectors, max_ignored,
+                    chunk, queue_in, queue_out, nprobe=None, known=None, tiers=None):
+    """Entry point of the worker processes of `PostEditor`
+
+    Arguments:
+        index_path {str} -- Path given to `EmbeddingIndex.save` for the Portuguese index
+        lines {dict} -- Line number to the (src, ref, sys) sentences of the chunk
+        src_words {set} -- Source words to be corrected in the chunk
+        vectors {dict} -- English embeddings of the source words
+        max_ignored {int} -- Maximum number of ignored words of an error
+        chunk {list} -- Pairs (error index, error) to be post-edited
+        queue_in {multiprocessing.Queue} -- Receives -1 when the process must stop
+        queue_out {multiprocessing.Queue} -- Receives the results, then 0 at the end.
+                                             With `tiers`, the counts of answered
+                                             queries are sent first as ('tiers', counts)
+
+    Keyword Arguments:
+        nprobe {int} -- Lists searched per word if the index is an `IVFIndex`,
+                        None for an `EmbeddingIndex` (default: {None})
+        known {dict} -- Candidates of the words already looked up. Those also in
+                        `src_words` are searched for the errors whose candidates
+                        are too few once the ignored words are removed (default: {None})
+        tiers {list} -- Tiers of a `TieredIndex`, None for other indices (default: {None})
+    """
+    if tiers:
+        index_pt = TieredIndex.load(index_path, mmap_mode='r', tiers=tiers)
+    elif nprobe is None:
+        index_pt = EmbeddingIndex.load(index_path, mmap_mode='r')
+    else:
+        index_pt = IVFIndex.load(index_path, mmap_mode='r', nprobe=nprobe)
+    suggestions = closest_words_batch(src_words, vectors, index_pt, extra=max_ignored)
+    known = known or dict()
+    fallback = {w: suggestions[w] for w in src_words if w in known}
+    suggestions.update(known)
+    if tiers:
+        queue_out.put(('tiers', index_pt.tier_counts))
+
+    src_lines = {line: sents[0] for (line, sents) in lines.items()}
+    ref_lines = {line: sents[1] for (line, sents) in lines.items()}
+    sys_lines = {line: sents[2] for (line, sents) in lines.items()}
+    edit_chunk(src_lines, ref_lines, sys_lines, suggestions, chunk, queue_in, queue_out,
+               fallback)
+
+
+def error_queries(src_lines, sys_lines, errors):
+    """Pairs (source word, MT words to ignore) of each source word of the errors
+
+    Arguments:
+        src_lines {dict} -- Source sentences, by line
+        sys_lines {dict} -- MT sentences, by line
+        errors {list} -- Pairs (line, error) as given by `BlastReader.get_filtered_errors`
+
+    Returns:
+        list -- The pairs
+    """
+    return [(src_lines[line][i], [sys_lines[line][j] for j in error[1]])
+            for (line, error) in errors for i in error[0] if i > -1]
+
+
+def edit_chunk(src_lines, ref_lines, sys_lines, suggestions, chunk, queue_in, queue_out,
+               fallback=None):
+    """Writes the APE annotation of each error in `chunk`.
+    Each result is sent to `queue_out` as a pair (error index, text) and 0 is sent
+    at the end. The loop stops as soon as -1 is read from `queue_in`.
+    Words of `fallback` use its candidates when those of `suggestions`, taken from
+    a `NeighbourTable`, are too few once the ignored words are removed
+    """
+    for (error_index, error) in chunk:
+        try:
+            msg = queue_in.get_nowait()
+            if msg == -1:
+                break
+        except queue.Empty:
+            line = error[0]
+            write_line = ''
+            write_line += ' '.join(src_lines[line])
+            write_line += '\n'
+            write_line += ' '.join(ref_lines[line])
+            write_line += '\n'
+            write_line += ' '.join(sys_lines[line])
+            write_line += '\n'
+
+            error_info = [','.join(map(str, e)) for e in error[1][:-1]]
+            error_info.append(error[1][-1])
+            write_line += '#'.join(error_info)
+            write_line += '\n'
+
+            sentence_to_correct = src_lines[line]
+            sys_sentence = sys_lines[line]
+            candidates = list()
+            words_to_ignore = [sys_sentence[j] for j in error[1][1]]
+            for i in error[1][0]:
+                if i > -1:
+                    word = sentence_to_correct[i]
+                    word_candidates = filter_candidates(suggestions[word],
+                                                        words_to_ignore=words_to_ignore)
+                    if fallback and word in fallback and len(word_candidates) < NEIGHBOURS_K:
+                        word_candidates = filter_candidates(fallback[word],
+                                                            words_to_ignore=words_to_ignore)
+                    candidates.extend(['-.-'.join([w[0], 'white']) for w in word_candidates])
+                else:
+                    candidates.append('-.-'.join(['***', 'white']))
+            write_line += '#@'.join(candidates)
+            write_line += '\n'
+
+            queue_out.put((error_index, write_line))
+    queue_out.put(0)
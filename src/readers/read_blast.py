@@ -1,3 +1,11 @@
+from collections import namedtuple
+from itertools import chain, compress
+
+# One sentence block of a BLAST file.
+# `errors` holds the error indexes and type, as in `BlastReader.error_lines`
+BlastRecord = namedtuple('BlastRecord', ['line', 'src', 'ref', 'sys', 'errors'])
+
+
 class BlastReader(object):
 
     def __init__(self, filename):
@@ -6,6 +14,37 @@ class BlastReader(object):
         self.ref_lines = list()
         self.sys_lines = list()
 
+        # Indices built while parsing, holding positions in `error_lines`
+        self.line_errors = list()
+        self.tag_errors = dict()
+        # One byte per line, set when the line has no error
+        self.correct_lines = bytearray()
+
+        for record in self.iter_records(filename):
+            self.src_lines.append(record.src)
+            self.ref_lines.append(record.ref)
+            self.sys_lines.append(record.sys)
+
+            positions = list()
+            for error_indexes in record.errors:
+                position = len(self.error_lines)
+                positions.append(position)
+                self.tag_errors.setdefault(error_indexes[-1], list()).append(position)
+                self.error_lines.append((record.line, error_indexes))
+            self.line_errors.append(positions)
+            self.correct_lines.append(0 if positions else 1)
+
+    @staticmethod
+    def iter_records(filename):
+        """Reads a BLAST file one sentence block at a time,
+        so the whole file never needs to be kept in memory
+
+        Arguments:
+            filename {str} -- Path to the BLAST file
+
+        Yields:
+            BlastRecord -- Sentences and parsed errors of each block
+        """
         with open(filename, 'r') as blast_file:
             blast_file.readline()
             blast_file.readline()
@@ -17,22 +56,33 @@ class BlastReader(object):
                 if not src:
                     break
 
-                self.src_lines.append(src)
-                self.ref_lines.append(blast_file.readline().split())
-                self.sys_lines.append(blast_file.readline().split())
+                ref = blast_file.readline().split()
+                sys = blast_file.readline().split()
                 blast_file.readline()
                 errors = [e.split('#') for e in blast_file.readline().split()]
 
+                error_list = list()
                 for error in errors:
                     error_indexes = [list(map(int, e.split(',')))
                                      for e in error[:-1]]
                     error_indexes.append(error[-1])
-                    self.error_lines.append((line, error_indexes))
+                    error_list.append(error_indexes)
+
+                yield BlastRecord(line, src, ref, sys, error_list)
 
                 line = line + 1
 
     def get_filtered_errors(self, tags):
-        return [e for e in self.error_lines if e[1][-1] in tags]
+        """Get all errors of the given types, in the order they appear in the file
+
+        Arguments:
+            tags {list} -- Error types
+
+        Returns:
+            list -- Pairs (line, error indexes and type)
+        """
+        positions = chain.from_iterable(self.tag_errors.get(t, list()) for t in set(tags))
+        return [self.error_lines[p] for p in sorted(positions)]
 
     def get_incorrect_words(self, errors):
         """Get all incorrect words aligned by annotation
@@ -65,15 +115,7 @@ class BlastReader(object):
                     no error referring to it
         """
 
-        num_lines = len(self.src_lines)
-        error_indices = [l for (l, _) in self.error_lines]
-        correct_indices = list()
-
-        for i in range(num_lines):
-            if i not in error_indices:
-                correct_indices.append(i)
-
-        return correct_indices
+        return list(compress(range(len(self.correct_lines)), self.correct_lines))
 
     def get_error_messages(self, line):
         """Returns all errors associated to a given line index
@@ -85,4 +127,6 @@ class BlastReader(object):
             list -- All errors (indexes and error type) associated to the given line
         """
 
-        return [error[1] for error in self.error_lines if line == error[0]]
+        if not 0 <= line < len(self.line_errors):
+            return list()
+        return [self.error_lines[p][1] for p in self.line_errors[line]]
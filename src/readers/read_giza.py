@@ -1,36 +1,273 @@
-import re
+import os
+import numpy as np
+
+# Encodes None in the index arrays of `Alignment`.
+# Not -1, which is a valid source index: the one of NULL
+NO_ALIGNMENT = np.iinfo(np.int32).min
+
+
+class Alignment(object):
+    """Word alignment of a sentence pair.
+
+    Iterating over it gives the same (src, sys) tuples as the list it was built from,
+    in the same order, with None for unaligned words. The aligned words of each
+    index are kept in CSR arrays (offsets into int32 indices), in both directions,
+    so `sys_for` and `src_for` do not scan all tuples.
+    """
+    __slots__ = ['src', 'sys', 'src_offsets', 'src_to_sys', 'sys_offsets', 'sys_to_src']
+
+    def __init__(self, pairs):
+        self._set_pairs(np.array([NO_ALIGNMENT if src is None else src for (src, _) in pairs],
+                                 dtype=np.int32),
+                        np.array([NO_ALIGNMENT if sys is None else sys for (_, sys) in pairs],
+                                 dtype=np.int32))
+
+    @classmethod
+    def from_arrays(cls, src, sys):
+        """Builds the alignment from int32 arrays of source and MT indices,
+        with `NO_ALIGNMENT` for None
+        """
+        alignment = cls.__new__(cls)
+        alignment._set_pairs(np.asarray(src, dtype=np.int32), np.asarray(sys, dtype=np.int32))
+        return alignment
+
+    def _set_pairs(self, src, sys):
+        self.src = src
+        self.sys = sys
+        self.src_offsets, self.src_to_sys = self._adjacency(self.src, self.sys)
+        self.sys_offsets, self.sys_to_src = self._adjacency(self.sys, self.src)
+
+    @staticmethod
+    def _adjacency(keys, values):
+        """CSR arrays with the `values` paired to each key, in pair order.
+        Row `k + 1` has the values of key `k`, since keys start at -1
+        """
+        valid = np.flatnonzero(keys != NO_ALIGNMENT)
+        order = valid[np.argsort(keys[valid], kind='mergesort')]
+        counts = np.bincount(keys[valid] + 1)
+        offsets = np.zeros(len(counts) + 1, dtype=np.int32)
+        np.cumsum(counts, out=offsets[1:])
+        return offsets, values[order]
+
+    @staticmethod
+    def _lookup(offsets, indices, index):
+        if index is None or index < -1 or index >= len(offsets) - 2:
+            return list()
+        return [None if i == NO_ALIGNMENT else i
+                for i in indices[offsets[index + 1]:offsets[index + 2]].tolist()]
+
+    def sys_for(self, src_index):
+        """Same as `[a[1] for a in alignment if a[0] == src_index]`
+
+        Arguments:
+            src_index {int} -- Index of the source word
+
+        Returns:
+            list -- Indices of the aligned MT words, None if it is not aligned
+        """
+        return self._lookup(self.src_offsets, self.src_to_sys, src_index)
+
+    def src_for(self, sys_index):
+        """Same as `[a[0] for a in alignment if a[1] == sys_index]`
+
+        Arguments:
+            sys_index {int} -- Index of the MT word
+
+        Returns:
+            list -- Indices of the aligned source words, None if it is not aligned
+        """
+        return self._lookup(self.sys_offsets, self.sys_to_src, sys_index)
+
+    def __getitem__(self, index):
+        src, sys = int(self.src[index]), int(self.sys[index])
+        return (None if src == NO_ALIGNMENT else src,
+                None if sys == NO_ALIGNMENT else sys)
+
+    def __iter__(self):
+        for (src, sys) in zip(self.src.tolist(), self.sys.tolist()):
+            yield (None if src == NO_ALIGNMENT else src,
+                   None if sys == NO_ALIGNMENT else sys)
+
+    def __len__(self):
+        return len(self.src)
+
+
+def cache_paths(path):
+    """Paths of the binary cache of a GIZA A3 file.
+
+    - `.sents.npy`: one row per sentence, sorted by sentence number, with the number
+      and the end offsets of its pairs, of its source tokens and of its MT tokens
+    - `.pairs.npy`: (src, sys) alignment pairs, `NO_ALIGNMENT` for None
+    - `.tokens.npy`: ids of the source tokens then of the MT tokens of each sentence
+    - `.vocab`: one token per line, in the order of the ids
+
+    Arguments:
+        path {str} -- Path to the A3 file
+
+    Returns:
+        tuple -- Paths to the sentences, pairs, tokens and vocabulary files
+    """
+    return path + '.sents.npy', path + '.pairs.npy', path + '.tokens.npy', path + '.vocab'
+
+
+def has_cache(path):
+    """Checks whether the binary cache of an A3 file exists and is up to date
+    """
+    try:
+        a3_mtime = os.path.getmtime(path)
+        return all(os.path.getmtime(p) >= a3_mtime for p in cache_paths(path))
+    except OSError:
+        return False
+
+
+def parse_a3(path):
+    """Parses an A3 file in a single pass, with string splits instead of regexes
+
+    Arguments:
+        path {str} -- Path to the A3 file
+
+    Returns:
+        tuple -- Arrays of sentences, pairs and tokens and the vocabulary, as in `cache_paths`
+    """
+    vocab = list()
+    word_ids = dict()
+    sents = list()
+
+    def token_ids(words):
+        ids = list()
+        for word in words:
+            if word not in word_ids:
+                word_ids[word] = len(vocab)
+                vocab.append(word)
+            ids.append(word_ids[word])
+        return ids
+
+    with open(path, 'r') as giza_file:
+        while True:
+            line_info = giza_file.readline()
+            if not line_info:
+                break
+            line_plain = giza_file.readline()
+            line_aligned = giza_file.readline()
+
+            # Header: # Sentence pair (num) source length ...
+            line_num = int(line_info[line_info.index('(') + 1:line_info.index(')')])
+
+            # Aligned line: NULL ({ j ... }) word ({ j ... }) ...
+            pairs = list()
+            src_words = list()
+            for (i, part) in enumerate(line_aligned.split(' })')[:-1]):
+                word, indices = part.rsplit(' ({', 1)
+                word = word.strip()
+                indices = [int(j) - 1 for j in indices.split()]
+                if i > 0:
+                    src_words.append(word)
+                if not indices:
+                    pairs.append((i - 1, NO_ALIGNMENT))
+                elif i == 0:
+                    pairs.extend([(NO_ALIGNMENT, j) for j in indices])
+                else:
+                    pairs.extend([(i - 1, j) for j in indices])
+
+            sents.append((line_num - 1, pairs,
+                          token_ids(src_words), token_ids(line_plain.split())))
+
+    # MGIZA writes the sentences of each thread to a different part of the file
+    sents.sort(key=lambda sent: sent[0])
+
+    sent_rows = np.zeros((len(sents), 4), dtype=np.int64)
+    pair_rows = list()
+    tokens = list()
+    for (k, (num, pairs, src_ids, sys_ids)) in enumerate(sents):
+        pair_rows.extend(pairs)
+        tokens.extend(src_ids)
+        src_end = len(tokens)
+        tokens.extend(sys_ids)
+        sent_rows[k] = (num, len(pair_rows), src_end, len(tokens))
+
+    return (sent_rows,
+            np.array(pair_rows, dtype=np.int32).reshape(-1, 2),
+            np.array(tokens, dtype=np.int32),
+            vocab)
+
+
+def write_cache(path, sents, pairs, tokens, vocab):
+    """Writes the binary cache of an A3 file. Each file is written to a temporary
+    path then renamed, so an interrupted write never leaves a partial cache
+    """
+    sents_path, pairs_path, tokens_path, vocab_path = cache_paths(path)
+    for (array, array_path) in [(sents, sents_path), (pairs, pairs_path), (tokens, tokens_path)]:
+        with open(array_path + '.tmp', 'wb') as _file:
+            np.save(_file, array)
+    with open(vocab_path + '.tmp', 'w') as _file:
+        _file.write('\n'.join(vocab))
+    for cache_path in cache_paths(path):
+        os.replace(cache_path + '.tmp', cache_path)
+
+
+def read_cache(path):
+    sents_path, pairs_path, tokens_path, vocab_path = cache_paths(path)
+    with open(vocab_path, 'r') as _file:
+        vocab = _file.read().split('\n')
+    return (np.load(sents_path, mmap_mode='r'),
+            np.load(pairs_path, mmap_mode='r'),
+            np.load(tokens_path, mmap_mode='r'),
+            vocab)
+
+
+class AlignedLines(object):
+    """Sequence of the aligned sentences of an A3 file, sorted by sentence number.
+    The dictionary of each sentence is only built when it is accessed:
+
+    - `num`: sentence number, starting at 0
+    - `src`: source tokens
+    - `sys`: MT tokens
+    - `alignment`: `Alignment` between them
+    """
+
+    def __init__(self, sents, pairs, tokens, vocab, indices=None):
+        self.sents = sents
+        self.pairs = pairs
+        self.tokens = tokens
+        self.vocab = vocab
+        self.indices = range(len(sents)) if indices is None else indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return AlignedLines(self.sents, self.pairs, self.tokens, self.vocab,
+                                self.indices[index])
+
+        k = self.indices[index]
+        num, pairs_end, src_end, sys_end = self.sents[k].tolist()
+        _, pairs_start, _, src_start = self.sents[k - 1].tolist() if k > 0 else (0, 0, 0, 0)
+        pairs = self.pairs[pairs_start:pairs_end]
+        return {'num': num,
+                'sys': [self.vocab[i] for i in self.tokens[src_end:sys_end].tolist()],
+                'src': [self.vocab[i] for i in self.tokens[src_start:src_end].tolist()],
+                'alignment': Alignment.from_arrays(pairs[:, 0], pairs[:, 1])}
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
 
 
 class GIZAReader(object):
-    def __init__(self, filename):
-        self.aligned_lines = list()
-        with open(filename, 'r') as giza_file:
-            while True:
-                line_info = giza_file.readline()
-                if not line_info:
-                    break
-                line_plain = giza_file.readline()
-                line_aligned = giza_file.readline()
-
-                line_num = int(re.findall(r'\(([^\)]*)\)', line_info)[0])
-
-                # Parse line with alignments into tuples (word, alignment)
-                line_aligned = re.findall(
-                    r'([^\(]+) \(\{([^\}]*)\}\)', line_aligned)
-
-                # Alignment is represented as tuples of indices (src, sys)
-                alignment = list()
-
-                for (i, w) in enumerate(line_aligned):
-                    indices = list(map(int, w[1].split()))
-                    if not indices:
-                        alignment.append((i-1, None))
-                    else:
-                        alignment.extend(
-                            [(None, j-1) if w[0] == 'NULL' else (i-1, j-1) for j in indices])
-
-                self.aligned_lines.append({'num': line_num - 1,
-                                           'sys': line_plain.split(),
-                                           'src': [w[0] for w in line_aligned if w[0] != 'NULL'],
-                                           'alignment': alignment})
-        self.aligned_lines = sorted(self.aligned_lines, key=lambda x: x['num'])
+    """Reads the alignments of a GIZA A3 file.
+    The parsed file is kept in a binary cache next to it, which is memory-mapped
+    by later readers while the A3 file is not changed
+    """
+
+    def __init__(self, filename, use_cache=True):
+        if use_cache and has_cache(filename):
+            data = read_cache(filename)
+        else:
+            data = parse_a3(filename)
+            if use_cache:
+                try:
+                    write_cache(filename, *data)
+                except OSError:
+                    pass
+        self.aligned_lines = AlignedLines(*data)
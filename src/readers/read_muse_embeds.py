@@ -1,6 +1,9 @@
+import argparse
+import os
 import threading
 import numpy as np
-from scipy.spatial.distance import cosine
+from embeddings.index import EmbeddingIndex
+from embeddings.store import Embeddings
 
 
 class MuseReader(threading.Thread):
@@ -14,58 +17,211 @@ class MuseReader(threading.Thread):
         self.start()
 
     def run(self):
-        with open(self.path, 'r') as _file:
-            num_emb, dim = map(int, _file.readline().split())
-
-            for _ in range(num_emb):
-                if self.window.stop:
-                    break
-                line = _file.readline().split()
-                key = ' '.join(line[:-dim])
-                value = list(map(float, line[-dim:]))
-                self.embeds[key] = np.array(value)
-
+        self.embeds = read_embeddings(self.path, stop=lambda: self.window.stop)
         self.msg_queue.put(self.embeds)
 
 
 def load_embeddings(path_en, path_pt):
-    file_en = open(path_en, 'r')
-    file_pt = open(path_pt, 'r')
+    return read_embeddings(path_en), read_embeddings(path_pt)
 
-    emb_en = dict()
-    emb_pt = dict()
 
-    num_emb, dim = map(int, file_en.readline().split())
-    file_pt.readline()
+def cache_paths(path):
+    """Paths of the binary cache of a MUSE file: a float32 `.npy` matrix
+    and a vocabulary file with one word per line, in the same order as the rows
 
-    for _ in range(num_emb):
-        line_pt = file_pt.readline().split()
-        key_pt = ' '.join(line_pt[:-dim])
-        value_pt = list(map(float, line_pt[-dim:]))
-        emb_pt[key_pt] = np.array(value_pt)
+    Arguments:
+        path {str} -- Path to the MUSE text file
 
-        line_en = file_en.readline().split()
-        key_en = ' '.join(line_en[:-dim])
-        value_en = list(map(float, line_en[-dim:]))
-        emb_en[key_en] = np.array(value_en)
+    Returns:
+        tuple -- Paths to the matrix and to the vocabulary files
+    """
+    return path + '.npy', path + '.vocab'
 
-    file_en.close()
-    file_pt.close()
 
-    return emb_en, emb_pt
+def has_cache(path):
+    """Checks whether the binary cache of a MUSE file exists and is up to date
+    """
+    try:
+        text_mtime = os.path.getmtime(path)
+        return all(os.path.getmtime(p) >= text_mtime for p in cache_paths(path))
+    except OSError:
+        return False
+
+
+def read_embeddings(path, stop=None):
+    """Reads a MUSE embeddings file.
+    The binary cache is memory-mapped when available, so the pages are loaded
+    on demand and shared by every process reading the same file. Otherwise,
+    the text file is parsed and the cache is created for the next loads
+
+    Arguments:
+        path {str} -- Path to the MUSE text file
+
+    Keyword Arguments:
+        stop {callable} -- Returns True when parsing must be interrupted (default: {None})
+
+    Returns:
+        Embeddings -- Words and vectors in the file
+    """
+    if has_cache(path):
+        matrix_path, vocab_path = cache_paths(path)
+        with open(vocab_path, 'r', encoding='utf-8') as _file:
+            words = _file.read().split('\n')
+        return Embeddings(words, np.load(matrix_path, mmap_mode='r'))
+    return convert_embeddings(path, stop)
+
+
+def convert_embeddings(path, stop=None):
+    """Parses a MUSE text file and writes its binary cache, if its directory is writable.
+    No cache is written if parsing is interrupted by `stop`
+
+    Arguments:
+        path {str} -- Path to the MUSE text file
+
+    Keyword Arguments:
+        stop {callable} -- Returns True when parsing must be interrupted (default: {None})
+
+    Returns:
+        Embeddings -- Words and vectors read from the file
+    """
+    words = list()
+    with open(path, 'r') as _file:
+        num_emb, dim = map(int, _file.readline().split())
+        matrix = np.zeros((num_emb, dim), dtype=np.float32)
+
+        for i in range(num_emb):
+            if stop and stop():
+                return Embeddings(words, matrix[:i])
+            line = _file.readline().split()
+            words.append(' '.join(line[:-dim]))
+            matrix[i] = np.array(line[-dim:], dtype=np.float32)
+
+    # The embeddings are still returned when the directory is read-only
+    try:
+        write_cache(path, words, matrix)
+    except OSError:
+        pass
 
+    return Embeddings(words, matrix)
 
-def closest_words(word, emb_en, emb_pt, words_to_ignore=None):
-    if not words_to_ignore:
-        words_to_ignore = list()
+
+def write_cache(path, words, matrix):
+    """Writes the binary cache of a MUSE file. Each file is written to a temporary
+    path then renamed, so concurrent readers never see partial caches. The
+    temporary files are removed if a write fails
+    """
+    matrix_path, vocab_path = cache_paths(path)
+    try:
+        with open(matrix_path + '.tmp', 'wb') as _file:
+            np.save(_file, matrix)
+        with open(vocab_path + '.tmp', 'w', encoding='utf-8') as _file:
+            _file.write('\n'.join(words))
+        os.replace(matrix_path + '.tmp', matrix_path)
+        os.replace(vocab_path + '.tmp', vocab_path)
+    except OSError:
+        for cache_path in cache_paths(path):
+            if os.path.exists(cache_path + '.tmp'):
+                os.remove(cache_path + '.tmp')
+        raise
+
+
+def closest_words(word, emb_en, emb_pt, words_to_ignore=None, table=None):
+    """Suggests the Portuguese words closest to an English word.
+    Words of `table` are looked up instead of searched
+
+    Arguments:
+        word {str} -- English word
+        emb_en {dict} -- English embeddings
+        emb_pt {EmbeddingIndex} -- Index over the Portuguese embeddings.
+                                   A plain dict is also accepted, but the index
+                                   is then rebuilt on every call
+
+    Keyword Arguments:
+        words_to_ignore {list} -- Words that must not be suggested (default: {None})
+        table {NeighbourTable} -- Precomputed suggestions (default: {None})
+
+    Returns:
+        list -- Five pairs (word, cosine distance), or `['***']` if `word` has no embedding
+    """
+    if table is not None:
+        suggestions = table.lookup(word, words_to_ignore)
+        if suggestions is not None:
+            return suggestions
+    if not isinstance(emb_pt, EmbeddingIndex):
+        emb_pt = EmbeddingIndex(emb_pt)
     try:
         u = emb_en[word]
     except KeyError:
         return ['***']
     else:
-        words = np.array(list(emb_pt))
-        similarities = np.array(
-            [cosine(u, emb_pt[k]) if k not in words_to_ignore else float('Inf') for k in words])
-        similarities_indices = similarities.argsort()[:5]
-        return list(zip(words[similarities_indices],
-                        similarities[similarities_indices]))
+        return emb_pt.closest(u, words_to_ignore=words_to_ignore)
+
+
+def closest_words_batch(words, emb_en, emb_pt, k=5, extra=0, table=None):
+    """Suggests the closest Portuguese words for many English words at once.
+    Repeated words are searched only once, and words of `table` are not searched.
+    Each searched word gets `k + extra` candidates, so up to `extra` of them can
+    later be removed by `filter_candidates`. Words of `table` get their whole row
+
+    Arguments:
+        words {iterable} -- English words
+        emb_en {dict} -- English embeddings
+        emb_pt {EmbeddingIndex} -- Index over the Portuguese embeddings
+
+    Keyword Arguments:
+        k {int} -- Number of suggestions per word (default: {5})
+        extra {int} -- Additional candidates kept per word (default: {0})
+        table {NeighbourTable} -- Precomputed suggestions (default: {None})
+
+    Returns:
+        dict -- Candidates of each word in the same format as `closest_words`
+    """
+    if not isinstance(emb_pt, EmbeddingIndex):
+        emb_pt = EmbeddingIndex(emb_pt)
+
+    words = set(words)
+    candidates = dict()
+    if table is not None:
+        candidates = table.suggestions(words)
+
+    words = set(w for w in words if w not in candidates)
+    known_words = [w for w in words if w in emb_en]
+    candidates.update({w: ['***'] for w in words if w not in emb_en})
+
+    if known_words:
+        ids, scores = emb_pt.closest_batch(np.array([emb_en[w] for w in known_words]),
+                                           k=k + extra)
+        for (i, word) in enumerate(known_words):
+            candidates[word] = [(emb_pt.words[j], 1 - float(s))
+                                for (j, s) in zip(ids[i], scores[i])]
+    return candidates
+
+
+def filter_candidates(candidates, words_to_ignore=None, k=5):
+    """Removes the ignored words from the candidates of `closest_words_batch`
+
+    Arguments:
+        candidates {list} -- Candidates of a single word
+
+    Keyword Arguments:
+        words_to_ignore {list} -- Words that must not be suggested (default: {None})
+        k {int} -- Number of suggestions to keep (default: {5})
+
+    Returns:
+        list -- The first `k` candidates not in `words_to_ignore`
+    """
+    if candidates == ['***']:
+        return candidates
+    if not words_to_ignore:
+        words_to_ignore = list()
+    return [c for c in candidates if c[0] not in words_to_ignore][:k]
+
+
+if __name__ == '__main__':
+    ARG_PARSER = argparse.ArgumentParser(
+        description='Converts MUSE embeddings files to the binary cache format')
+    ARG_PARSER.add_argument('paths', nargs='+', help='Paths to MUSE text files')
+    for muse_path in ARG_PARSER.parse_args().paths:
+        convert_embeddings(muse_path)
+        if not has_cache(muse_path):
+            ARG_PARSER.exit(1, 'Could not write the cache of {}\n'.format(muse_path))